@@ -13,6 +13,58 @@ MEDSIGLIP_MODEL_ID = _get_env("MEDSIGLIP_MODEL_ID", "google/medsiglip")
 ENABLE_RETINAL = _get_env("ENABLE_RETINAL", "true").lower() == "true"
 ENABLE_TEXT_LLM = _get_env("ENABLE_TEXT_LLM", "true").lower() == "true"
 OFFLINE_ONLY = _get_env("OFFLINE_ONLY", "true").lower() == "true"
+PRELOAD_MODELS = _get_env("PRELOAD_MODELS", "true").lower() == "true"
+WARMUP_MODELS = _get_env("WARMUP_MODELS", "true").lower() == "true"
 
 MAX_UPLOAD_MB = int(_get_env("MAX_UPLOAD_MB", "25"))
 DB_PATH = _get_env("DB_PATH", "backend/data/diarisk.db")
+DB_POOL_SIZE = int(_get_env("DB_POOL_SIZE", "4"))
+DB_ASYNC_WRITES = _get_env("DB_ASYNC_WRITES", "true").lower() == "true"
+DB_WRITE_BATCH_SIZE = int(_get_env("DB_WRITE_BATCH_SIZE", "64"))
+DB_COMPRESS_BLOBS = _get_env("DB_COMPRESS_BLOBS", "true").lower() == "true"
+HISTORY_RETENTION_DAYS = int(_get_env("HISTORY_RETENTION_DAYS", "0"))
+HISTORY_ARCHIVE_DIR = _get_env("HISTORY_ARCHIVE_DIR", "backend/data/history_archive")
+HISTORY_COMPACTION_BATCH = int(_get_env("HISTORY_COMPACTION_BATCH", "500"))
+HISTORY_COMPACTION_INTERVAL_S = float(_get_env("HISTORY_COMPACTION_INTERVAL_S", "3600"))
+
+BATCH_JOB_WORKERS = int(_get_env("BATCH_JOB_WORKERS", "2"))
+BATCH_SPOOL_DIR = _get_env("BATCH_SPOOL_DIR", "backend/data/batch_spool")
+BATCH_MAX_UPLOAD_MB = int(_get_env("BATCH_MAX_UPLOAD_MB", "500"))
+
+INFERENCE_WORKERS = int(_get_env("INFERENCE_WORKERS", "2"))
+INFERENCE_QUEUE_SIZE = int(_get_env("INFERENCE_QUEUE_SIZE", "8"))
+QUEUE_FULL_STATUS = int(_get_env("QUEUE_FULL_STATUS", "503"))
+QUEUE_RETRY_AFTER_S = int(_get_env("QUEUE_RETRY_AFTER_S", "15"))
+ORCHESTRATOR_STAGE_WORKERS = int(_get_env("ORCHESTRATOR_STAGE_WORKERS", "6"))
+
+LLM_BATCHING = _get_env("LLM_BATCHING", "true").lower() == "true"
+LLM_MAX_BATCH_SIZE = int(_get_env("LLM_MAX_BATCH_SIZE", "8"))
+LLM_MAX_BATCH_WAIT_MS = int(_get_env("LLM_MAX_BATCH_WAIT_MS", "15"))
+LLM_PREFIX_CACHE = _get_env("LLM_PREFIX_CACHE", "true").lower() == "true"
+LLM_CACHE = _get_env("LLM_CACHE", "true").lower() == "true"
+LLM_CACHE_MAX_ENTRIES = int(_get_env("LLM_CACHE_MAX_ENTRIES", "1024"))
+LLM_CACHE_TTL_S = int(_get_env("LLM_CACHE_TTL_S", "86400"))
+LLM_CACHE_DB_PATH = _get_env("LLM_CACHE_DB_PATH", "")
+
+PARSE_CACHE = _get_env("PARSE_CACHE", "true").lower() == "true"
+PARSE_CACHE_MAX_ENTRIES = int(_get_env("PARSE_CACHE_MAX_ENTRIES", "256"))
+PARSE_CACHE_MAX_MB = int(_get_env("PARSE_CACHE_MAX_MB", "64"))
+PARSE_CACHE_DB_MAX_ENTRIES = int(_get_env("PARSE_CACHE_DB_MAX_ENTRIES", "5000"))
+PDF_TEXT_LAYER = _get_env("PDF_TEXT_LAYER", "true").lower() == "true"
+PDF_TEXT_MIN_CHARS = int(_get_env("PDF_TEXT_MIN_CHARS", "40"))
+OCR_WORKERS = int(_get_env("OCR_WORKERS", str(min(4, os.cpu_count() or 1))))
+OCR_DPI = int(_get_env("OCR_DPI", "200"))
+OCR_MAX_PAGES = int(_get_env("OCR_MAX_PAGES", "50"))
+OCR_GRAYSCALE = _get_env("OCR_GRAYSCALE", "true").lower() == "true"
+OCR_MEMORY_BUDGET_MB = int(_get_env("OCR_MEMORY_BUDGET_MB", "256"))
+
+PROFILING_ENABLED = _get_env("PROFILING_ENABLED", "false").lower() == "true"
+PROFILE_DIR = _get_env("PROFILE_DIR", "backend/data/profiles")
+PROFILE_TORCH = _get_env("PROFILE_TORCH", "false").lower() == "true"
+PROFILE_TOKEN = _get_env("PROFILE_TOKEN", "")
+
+RETINAL_INDEX = _get_env("RETINAL_INDEX", "true").lower() == "true"
+RETINAL_INDEX_DIR = _get_env("RETINAL_INDEX_DIR", "backend/data/retinal_index")
+RETINAL_REUSE_DISTANCE = float(_get_env("RETINAL_REUSE_DISTANCE", "0.02"))
+RETINAL_INPUT_SIZE = int(_get_env("RETINAL_INPUT_SIZE", "896"))
+RETINAL_CROP = _get_env("RETINAL_CROP", "true").lower() == "true"
@@ -1,28 +1,78 @@
 from __future__ import annotations
 
-from typing import Optional
+import asyncio
+import json
+from concurrent.futures import Future
+from contextlib import asynccontextmanager
+from datetime import date
+from typing import Any, AsyncIterator, List, Literal, Optional
 
-from fastapi import FastAPI, File, Form, HTTPException, UploadFile
+from fastapi import FastAPI, File, Form, Header, HTTPException, Response, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
 
 from app import config
-from app.schemas import AnalysisResponse, LabParseResult
+from app.schemas import AgentTraceItem, AnalysisResponse, LabParseResult
+from app.services.batch_jobs import BatchJobError, BatchJobRunner, unpack_zip
+from app.services.history_archive import HistoryArchive
+from app.services.history_export import MEDIA_TYPES, export_history
+from app.services.inference_pool import InferencePool, PoolSaturatedError
 from app.services.lab_parser import LabParser
-from app.services.orchestrator import OrchestratorAgent
+from app.services.llm import TextLLM
+from app.services.metrics import registry as metrics_registry
+from app.services.model_registry import ModelRegistry
+from app.services.ocr_pool import OCRWorkerPool
+from app.services.orchestrator import OrchestratorAgent, OrchestratorOutput
+from app.services.parse_cache import ParseResultCache
+from app.services.preload import ModelPreloader
+from app.services.profiling import RequestProfiler, authorize
+from app.services.retinal import RetinalAnalyzer
+from app.services.retinal_index import RetinalEmbeddingIndex
 from app.storage import SQLiteStore
 
-app = FastAPI(title="DiaRisk AI Backend", version="0.1.0")
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    preloader.start()
+    batch_runner.start()
+    store.start_backfill()
+    history_archive.start()
+    yield
+    history_archive.shutdown()
+    batch_runner.shutdown()
+    inference_pool.shutdown()
+    orchestrator.shutdown()
+    OCRWorkerPool.instance().shutdown()
+    store.close()
+
+
+app = FastAPI(title="DiaRisk AI Backend", version="0.1.0", lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=False,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-DiaRisk-Profile-Id"],
 )
 
-lab_parser = LabParser()
-orchestrator = OrchestratorAgent()
 store = SQLiteStore()
+history_archive = HistoryArchive(store)
+parse_cache = ParseResultCache(store) if config.PARSE_CACHE else None
+lab_parser = LabParser(cache=parse_cache)
+retinal_index = RetinalEmbeddingIndex() if config.RETINAL_INDEX else None
+orchestrator = OrchestratorAgent(
+    intake_agent=lab_parser,
+    retinal_agent=RetinalAnalyzer(index=retinal_index, store=store),
+)
+inference_pool = InferencePool()
+batch_runner = BatchJobRunner(
+    store,
+    orchestrator,
+    persist=lambda result, queue_wait_ms: _persist(_build_response(result, queue_wait_ms), result).result(),
+)
+preloader = ModelPreloader()
 
 
 @app.get("/health")
@@ -30,28 +80,128 @@ def health() -> dict:
     return {"status": "ok"}
 
 
+@app.get("/ready")
+def ready() -> JSONResponse:
+    is_ready, body = preloader.readiness()
+    return JSONResponse(status_code=200 if is_ready else 503, content=body)
+
+
 @app.post("/api/labs/parse", response_model=LabParseResult)
 async def parse_labs(lab_report: UploadFile = File(...)) -> LabParseResult:
     file_bytes = await _read_file(lab_report)
-    return lab_parser.parse(lab_report.filename or "lab_report", file_bytes)
+    result, _ = await _admit(lab_parser.parse, lab_report.filename or "lab_report", file_bytes)
+    return result
+
+
+# Set on analyses run with profiling; names the files written under PROFILE_DIR.
+PROFILE_ID_HEADER = "X-DiaRisk-Profile-Id"
 
 
 @app.post("/api/analyze", response_model=AnalysisResponse)
 async def analyze(
+    response: Response,
     lab_report: UploadFile = File(...),
     retinal_image: Optional[UploadFile] = File(None),
     cognitive_notes: Optional[str] = Form(None),
+    patient_id: Optional[str] = Form(None),
+    profile: Optional[str] = None,
+    x_diarisk_profile: Optional[str] = Header(None),
 ) -> AnalysisResponse:
+    patient_id = _patient_id(patient_id)
+    profiler = _profiler(x_diarisk_profile or profile)
     lab_bytes = await _read_file(lab_report)
     retinal_bytes = await _read_file(retinal_image) if retinal_image else None
-    result = orchestrator.run(
+    result, queue_wait_ms = await _admit(
+        orchestrator.run,
         lab_filename=lab_report.filename or "lab_report",
         lab_bytes=lab_bytes,
         retinal_bytes=retinal_bytes,
         cognitive_notes=cognitive_notes,
+        profiler=profiler,
     )
+    if profiler is not None:
+        response.headers[PROFILE_ID_HEADER] = profiler.id
+    analysis = _build_response(result, queue_wait_ms)
+    _persist(analysis, result, patient_id)
+    return analysis
+
+
+# SSE event name emitted when each orchestrator stage finishes.
+STAGE_EVENTS = {
+    "intake": "intake",
+    "lab_value": "lab_insights",
+    "retinal": "retinal",
+    "cognitive": "cognitive",
+    "risk": "risk_scores",
+    "recommendation": "recommendations",
+}
+
+
+@app.post("/api/analyze/stream")
+async def analyze_stream(
+    lab_report: UploadFile = File(...),
+    retinal_image: Optional[UploadFile] = File(None),
+    cognitive_notes: Optional[str] = Form(None),
+    patient_id: Optional[str] = Form(None),
+    profile: Optional[str] = None,
+    x_diarisk_profile: Optional[str] = Header(None),
+) -> StreamingResponse:
+    patient_id = _patient_id(patient_id)
+    profiler = _profiler(x_diarisk_profile or profile)
+    lab_bytes = await _read_file(lab_report)
+    retinal_bytes = await _read_file(retinal_image) if retinal_image else None
 
-    response = AnalysisResponse(
+    loop = asyncio.get_running_loop()
+    events: asyncio.Queue = asyncio.Queue()
+
+    def on_stage(key: str, result: Any, trace_item: AgentTraceItem) -> None:
+        payload = {"result": _jsonable(result), "trace": trace_item.model_dump(mode="json")}
+        loop.call_soon_threadsafe(events.put_nowait, (STAGE_EVENTS[key], payload))
+
+    future = _admit(
+        orchestrator.run,
+        lab_filename=lab_report.filename or "lab_report",
+        lab_bytes=lab_bytes,
+        retinal_bytes=retinal_bytes,
+        cognitive_notes=cognitive_notes,
+        on_stage=on_stage,
+        profiler=profiler,
+    )
+
+    async def stream() -> AsyncIterator[str]:
+        while not future.done() or not events.empty():
+            next_event = asyncio.ensure_future(events.get())
+            await asyncio.wait({next_event, future}, return_when=asyncio.FIRST_COMPLETED)
+            if next_event.done():
+                yield _sse(*next_event.result())
+            else:
+                next_event.cancel()
+        try:
+            result, queue_wait_ms = future.result()
+        except Exception as exc:  # pragma: no cover - surfaced to the client as an event
+            yield _sse("error", {"detail": str(exc)})
+            return
+        response = _build_response(result, queue_wait_ms)
+        _persist(response, result, patient_id)
+        yield _sse("complete", response.model_dump(mode="json"))
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            **({PROFILE_ID_HEADER: profiler.id} if profiler is not None else {}),
+        },
+    )
+
+
+def _build_response(result: OrchestratorOutput, queue_wait_ms: int) -> AnalysisResponse:
+    result.agent_trace.insert(
+        0,
+        AgentTraceItem(agent="Inference Queue", status="ok", duration_ms=queue_wait_ms),
+    )
+    return AnalysisResponse(
         labs=result.labs,
         lab_insights=result.lab_insights,
         retinal=result.retinal,
@@ -61,7 +211,13 @@ async def analyze(
         agent_trace=result.agent_trace,
         warnings=result.warnings,
     )
-    store.insert_analysis(
+
+
+def _persist(
+    response: AnalysisResponse, result: OrchestratorOutput, patient_id: Optional[str] = None
+) -> "Future[int]":
+    """Store the analysis without waiting for the commit; the future resolves to its id."""
+    analysis = dict(
         labs=response.labs.model_dump(),
         lab_insights=response.lab_insights.model_dump() if response.lab_insights else None,
         retinal=response.retinal.model_dump() if response.retinal else None,
@@ -70,17 +226,203 @@ async def analyze(
         recommendations=[rec.model_dump() for rec in response.recommendations],
         agent_trace=[item.model_dump() for item in response.agent_trace],
         warnings=response.warnings,
+        patient_id=patient_id,
     )
-    return response
+    if config.DB_ASYNC_WRITES:
+        stored = store.submit_analysis(**analysis)
+    else:
+        stored = Future()
+        stored.set_result(store.insert_analysis(**analysis))
+
+    embedding = result.retinal_embedding
+    if retinal_index is not None and embedding is not None:
+
+        def index_embedding(done: "Future[int]") -> None:
+            if done.exception() is None:
+                retinal_index.add(done.result(), embedding)
+
+        stored.add_done_callback(index_embedding)
+    return stored
+
+
+@app.post("/api/jobs", status_code=202)
+async def create_job(
+    lab_reports: Optional[List[UploadFile]] = File(None),
+    archive: Optional[UploadFile] = File(None),
+    cognitive_notes: Optional[str] = Form(None),
+) -> dict:
+    files = [(upload.filename or "lab_report", await _read_file(upload)) for upload in lab_reports or []]
+    max_bytes = config.BATCH_MAX_UPLOAD_MB * 1024 * 1024
+    try:
+        if archive is not None:
+            files += unpack_zip(await _read_file(archive, config.BATCH_MAX_UPLOAD_MB), max_bytes)
+        job_id = await asyncio.to_thread(batch_runner.submit, files, cognitive_notes)
+    except BatchJobError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return batch_runner.status(job_id)
+
+
+@app.get("/api/jobs/{job_id}")
+def get_job(job_id: str) -> dict:
+    status = batch_runner.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return status
+
+
+@app.get("/api/jobs/{job_id}/results")
+def get_job_results(job_id: str, after: int = 0, limit: int = 50) -> dict:
+    if batch_runner.status(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    items = store.fetch_batch_results(job_id, after=after, limit=max(1, min(limit, 500)))
+    for item in items:
+        item["analysis"] = _fetch_analysis(item["analysis_id"]) if item["analysis_id"] else None
+    return {"items": items, "next_after": items[-1]["finished_seq"] if items else after}
+
+
+@app.get("/api/stats")
+def get_stats() -> dict:
+    return {
+        "inference_pool": inference_pool.stats(),
+        "llm": TextLLM.stats(),
+        "parse_cache": parse_cache.stats() if parse_cache is not None else None,
+        "retinal_index": retinal_index.stats() if retinal_index is not None else None,
+        "history_archive": history_archive.stats(),
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics() -> PlainTextResponse:
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/api/models/memory")
+def get_model_memory() -> dict:
+    return ModelRegistry.instance().memory_report()
 
 
 @app.get("/api/history")
-def get_history(limit: int = 10) -> dict:
-    return {"items": store.fetch_recent(limit=limit)}
+def get_history(
+    limit: int = 10,
+    before: Optional[int] = None,
+    complication: Optional[Literal["dementia", "cardiovascular", "retinopathy", "nephropathy", "neuropathy"]] = None,
+    level: Optional[Literal["Low", "Moderate", "High"]] = None,
+    min_score: Optional[float] = None,
+    since_days: Optional[int] = None,
+    min_a1c: Optional[float] = None,
+    max_egfr: Optional[float] = None,
+    retinal_grade: Optional[str] = None,
+    fields: Optional[str] = None,
+    patient_id: Optional[str] = None,
+) -> dict:
+    if (level is not None or min_score is not None) and complication is None:
+        raise HTTPException(status_code=400, detail="level and min_score filter on a complication.")
+    try:
+        items, next_cursor = store.fetch_history(
+            limit=max(1, min(limit, 500)),
+            before_id=before,
+            complication=complication,
+            level=level,
+            min_score=min_score,
+            since_days=since_days,
+            min_a1c=min_a1c,
+            max_egfr=max_egfr,
+            retinal_grade=retinal_grade,
+            fields=_fields(fields),
+            patient_id=patient_id,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return {"items": items, "next_cursor": next_cursor}
+
+
+@app.get("/api/history/export")
+def export_history_rows(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    fields: Optional[str] = None,
+) -> StreamingResponse:
+    try:
+        body = export_history(
+            store, format, fields=_fields(fields), since=since, until=until, archive=history_archive
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return StreamingResponse(
+        body,
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="diarisk-history.{format}"'},
+    )
+
+
+@app.get("/api/history/{analysis_id}")
+def get_analysis(analysis_id: int, fields: Optional[str] = None) -> dict:
+    try:
+        analysis = _fetch_analysis(analysis_id, _fields(fields))
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    if analysis is None:
+        raise HTTPException(status_code=404, detail="Analysis not found.")
+    return analysis
+
+
+def _fetch_analysis(analysis_id: int, fields: Optional[List[str]] = None) -> Optional[dict]:
+    # Checked in this order, a row being archived concurrently is found in one place or the other.
+    return store.fetch_by_id(analysis_id, fields) or history_archive.fetch(analysis_id, fields)
+
+
+@app.get("/api/patients/{patient_id}/trends")
+def get_patient_trends(patient_id: str) -> dict:
+    trends = store.fetch_patient_trends(patient_id)
+    if not trends:
+        raise HTTPException(status_code=404, detail="No analyses recorded for this patient.")
+    return {"patient_id": patient_id, "metrics": trends}
+
+
+def _patient_id(value: Optional[str]) -> Optional[str]:
+    value = (value or "").strip()
+    if len(value) > 128:
+        raise HTTPException(status_code=400, detail="patient_id is longer than 128 characters.")
+    return value or None
+
+
+def _profiler(flag: Optional[str]) -> Optional[RequestProfiler]:
+    try:
+        return RequestProfiler() if authorize(flag) else None
+    except PermissionError as exc:
+        raise HTTPException(status_code=403, detail=str(exc)) from exc
+
+
+def _fields(fields: Optional[str]) -> Optional[List[str]]:
+    return [name.strip() for name in fields.split(",") if name.strip()] if fields else None
+
+
+def _admit(fn, *args, **kwargs) -> "asyncio.Future":
+    try:
+        return inference_pool.submit(fn, *args, **kwargs)
+    except PoolSaturatedError as exc:
+        raise HTTPException(
+            status_code=config.QUEUE_FULL_STATUS,
+            detail=str(exc),
+            headers={"Retry-After": str(exc.retry_after_s)},
+        ) from exc
+
+
+def _jsonable(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, list):
+        return [_jsonable(item) for item in value]
+    return value
+
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
 
-async def _read_file(upload: UploadFile) -> bytes:
+async def _read_file(upload: UploadFile, max_mb: int = config.MAX_UPLOAD_MB) -> bytes:
     file_bytes = await upload.read()
-    if len(file_bytes) > config.MAX_UPLOAD_MB * 1024 * 1024:
+    if len(file_bytes) > max_mb * 1024 * 1024:
         raise HTTPException(status_code=413, detail="File too large.")
     return file_bytes
@@ -67,7 +67,12 @@ class Recommendation(BaseModel):
 class AgentTraceItem(BaseModel):
     agent: str
     status: str
+    start_offset_ms: Optional[int] = None
     duration_ms: Optional[int] = None
+    cache_hit: Optional[bool] = None
+    details: Optional[Dict[str, Any]] = None
+    # Nested {name, start_offset_ms, duration_ms, spans} steps within the stage; offsets are from its start.
+    spans: Optional[List[Dict[str, Any]]] = None
     notes: Optional[str] = None
 
 
@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import io
+import re
+import threading
+import uuid
+import zipfile
+from pathlib import Path
+from time import time
+from typing import Callable, Optional
+
+from app import config
+from app.services.orchestrator import OrchestratorAgent, OrchestratorOutput
+from app.storage import SQLiteStore
+
+_UNSAFE_FILENAME = re.compile(r"[^A-Za-z0-9._-]+")
+
+
+class BatchJobError(ValueError):
+    pass
+
+
+def unpack_zip(archive: bytes, max_bytes: int) -> list[tuple[str, bytes]]:
+    """Lab reports inside a zip, skipping directories and macOS metadata."""
+    try:
+        bundle = zipfile.ZipFile(io.BytesIO(archive))
+    except zipfile.BadZipFile as exc:
+        raise BatchJobError("Archive is not a valid zip file.") from exc
+    members = [
+        info
+        for info in bundle.infolist()
+        if not info.is_dir() and not Path(info.filename).name.startswith(".") and "__MACOSX" not in info.filename
+    ]
+    if sum(info.file_size for info in members) > max_bytes:
+        raise BatchJobError("Archive expands beyond the batch upload limit.")
+    return [(Path(info.filename).name, bundle.read(info)) for info in members]
+
+
+class BatchJobRunner:
+    """Runs batch analysis items on background threads, one orchestrator run per lab report.
+
+    Uploads are spooled to disk and every item's state lives in the store, so
+    queued and interrupted items are picked up again after a restart. Several
+    items run at once; their LLM generations meet in the shared generation
+    batcher and their PDF pages in the shared OCR pool, so a large job is
+    batched across items without a separate code path.
+    """
+
+    def __init__(
+        self,
+        store: SQLiteStore,
+        orchestrator: OrchestratorAgent,
+        persist: Callable[[OrchestratorOutput, int], int],
+        workers: int | None = None,
+        spool_dir: str | None = None,
+    ) -> None:
+        self.store = store
+        self.orchestrator = orchestrator
+        self.persist = persist
+        self.workers = max(1, workers or config.BATCH_JOB_WORKERS)
+        self.spool_dir = Path(spool_dir or config.BATCH_SPOOL_DIR)
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads: list[threading.Thread] = []
+
+    def start(self) -> None:
+        self.store.requeue_running_batch_items()
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"batch-job-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, files: list[tuple[str, bytes]], cognitive_notes: Optional[str] = None) -> str:
+        if not files:
+            raise BatchJobError("No lab reports to analyze.")
+        job_id = uuid.uuid4().hex
+        job_dir = self.spool_dir / job_id
+        job_dir.mkdir(parents=True, exist_ok=True)
+        items = []
+        for position, (filename, file_bytes) in enumerate(files):
+            path = job_dir / f"{position:06d}-{_UNSAFE_FILENAME.sub('_', filename)}"
+            path.write_bytes(file_bytes)
+            items.append((filename, str(path)))
+        self.store.create_batch_job(job_id, cognitive_notes, items)
+        self._wakeup.set()
+        return job_id
+
+    def status(self, job_id: str) -> Optional[dict]:
+        job = self.store.fetch_batch_job(job_id)
+        if job is None:
+            return None
+        counts = job.pop("counts")
+        total = sum(counts.values())
+        done, failed = counts.get("done", 0), counts.get("failed", 0)
+        if done + failed == total:
+            state = "completed_with_errors" if failed else "completed"
+        else:
+            state = "running" if done + failed or counts.get("running") else "queued"
+        return {
+            **job,
+            "status": state,
+            "total": total,
+            "queued": counts.get("queued", 0),
+            "running": counts.get("running", 0),
+            "done": done,
+            "failed": failed,
+        }
+
+    def shutdown(self) -> None:
+        self._stopping.set()
+        self._wakeup.set()
+        # Items still running stay marked as running and are requeued by the next start().
+        for thread in self._threads:
+            thread.join(timeout=1)
+        self._threads.clear()
+
+    def _work(self) -> None:
+        while not self._stopping.is_set():
+            item = self.store.claim_batch_item()
+            if item is None:
+                self._wakeup.wait(timeout=5)
+                self._wakeup.clear()
+                continue
+            self._run_item(item)
+
+    def _run_item(self, item: dict) -> None:
+        queue_wait_ms = int((time() - item["queued_at"]) * 1000)
+        spool_path = Path(item["spool_path"])
+        try:
+            result = self.orchestrator.run(
+                lab_filename=item["filename"],
+                lab_bytes=spool_path.read_bytes(),
+                retinal_bytes=None,
+                cognitive_notes=item["cognitive_notes"],
+            )
+            analysis_id = self.persist(result, queue_wait_ms)
+        except Exception as exc:  # pragma: no cover - recorded on the item
+            if self._stopping.is_set():
+                return
+            self.store.finish_batch_item(item["id"], error=str(exc))
+        else:
+            self.store.finish_batch_item(item["id"], analysis_id=analysis_id)
+        spool_path.unlink(missing_ok=True)
+        try:
+            spool_path.parent.rmdir()  # succeeds once the job's last spooled file is gone
+        except OSError:
+            pass
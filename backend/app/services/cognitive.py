@@ -5,10 +5,18 @@ from typing import Optional
 
 from app import config
 from app.schemas import CognitiveResult
-from app.services.llm import TextLLM
+from app.services.llm import StopRule, TextLLM
 
 
 class CognitiveAgent:
+    PROMPT_PREFIX = (
+        "You are a clinician scoring a brief cognitive screening. "
+        "Given the notes below, estimate a Mini-Cog style score from 0 to 5. "
+        "Return format: Score: X/5 | Summary: <one sentence>.\n"
+    )
+    # Done once the one-sentence summary has been written.
+    STOP = StopRule(r"summary[ \t]*[:\-]?[ \t]*\S[^\n]*?(?:[.!?](?=\s)|\n)")
+
     def __init__(self) -> None:
         self.llm = TextLLM()
 
@@ -24,16 +32,11 @@ class CognitiveAgent:
             )
 
         prompt = self._prompt(responses)
-        lines = self.llm.generate_lines(prompt, max_new_tokens=128)
+        lines = self.llm.generate_lines(prompt, max_new_tokens=128, prefix=self.PROMPT_PREFIX, stop=self.STOP)
         return self._parse(lines)
 
     def _prompt(self, responses: str) -> str:
-        return (
-            "You are a clinician scoring a brief cognitive screening. "
-            "Given the notes below, estimate a Mini-Cog style score from 0 to 5. "
-            "Return format: Score: X/5 | Summary: <one sentence>.\n"
-            f"Notes: {responses}"
-        )
+        return self.PROMPT_PREFIX + f"Notes: {responses}"
 
     def _parse(self, lines: list[str]) -> CognitiveResult:
         text = " ".join(lines)
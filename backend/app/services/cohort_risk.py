@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Mapping, Optional, Sequence
+
+import numpy as np
+
+from app.schemas import CognitiveResult, ComplicationRisk, LabValues, RetinalResult, RiskScores
+
+LEVELS = ("Low", "Moderate", "High")
+# Scores at or above these start the Moderate and High levels.
+LEVEL_THRESHOLDS = (35.0, 60.0)
+MAX_KEY_FACTORS = 3
+
+COLUMNS = ("a1c", "systolic_bp", "ldl", "egfr", "urine_albumin", "cognitive_score", "retinal_graded")
+
+_OPS = {">=": np.greater_equal, "<": np.less, "<=": np.less_equal, "==": np.equal}
+
+
+@dataclass(frozen=True)
+class Rule:
+    """One scoring rule: ``column <op> threshold`` adds ``points`` and names ``factor``.
+
+    ``otherwise`` makes the rule an ``elif`` of the rule before it, so it only
+    fires when that one did not. Comparisons against NaN are false, which is
+    how a missing value skips a rule.
+    """
+
+    factor: str
+    column: str
+    op: str
+    threshold: float
+    points: float
+    otherwise: bool = False
+
+
+@dataclass(frozen=True)
+class Complication:
+    base: float
+    rules: tuple[Rule, ...]
+
+
+# Mirrors RiskScorer rule for rule; benchmarks/cohort_risk.py checks they agree.
+COMPLICATIONS: dict[str, Complication] = {
+    "dementia": Complication(
+        20.0,
+        (
+            Rule("A1C above 8%", "a1c", ">=", 8, 15),
+            Rule("A1C above 7%", "a1c", ">=", 7, 10, otherwise=True),
+            Rule("Elevated systolic blood pressure", "systolic_bp", ">=", 140, 8),
+            Rule("Low cognitive screening score", "cognitive_score", "<=", 2, 12),
+            Rule("Borderline cognitive screening score", "cognitive_score", "<=", 3, 8, otherwise=True),
+        ),
+    ),
+    "cardiovascular": Complication(
+        18.0,
+        (
+            Rule("LDL above 130", "ldl", ">=", 130, 10),
+            Rule("Systolic BP above 140", "systolic_bp", ">=", 140, 10),
+            Rule("A1C above 7%", "a1c", ">=", 7, 6),
+        ),
+    ),
+    "retinopathy": Complication(
+        10.0,
+        (
+            Rule("A1C above 7.5%", "a1c", ">=", 7.5, 8),
+            Rule("Retinal image not graded", "retinal_graded", "==", 0, 0),
+        ),
+    ),
+    "nephropathy": Complication(
+        15.0,
+        (
+            Rule("Reduced eGFR", "egfr", "<", 60, 12),
+            Rule("Elevated urine albumin", "urine_albumin", ">=", 30, 10),
+            Rule("A1C above 7.5%", "a1c", ">=", 7.5, 6),
+        ),
+    ),
+    "neuropathy": Complication(
+        12.0,
+        (Rule("A1C above 7.5%", "a1c", ">=", 7.5, 7),),
+    ),
+}
+
+
+@dataclass
+class CohortScores:
+    """Per-complication score, level index into ``LEVELS`` and factor bitmask, one row per patient.
+
+    Bit ``i`` of a factor mask is set when rule ``i`` of that complication fired.
+    """
+
+    scores: dict[str, np.ndarray]
+    levels: dict[str, np.ndarray]
+    factors: dict[str, np.ndarray]
+
+    def __len__(self) -> int:
+        return len(next(iter(self.scores.values())))
+
+    def risk_scores(self, row: int) -> RiskScores:
+        return RiskScores(
+            **{
+                name: ComplicationRisk(
+                    score=float(self.scores[name][row]),
+                    level=LEVELS[self.levels[name][row]],
+                    key_factors=factor_labels(name, int(self.factors[name][row]))[:MAX_KEY_FACTORS],
+                    protective_factors=[],
+                )
+                for name in COMPLICATIONS
+            }
+        )
+
+
+def factor_labels(complication: str, bitmask: int) -> list[str]:
+    rules = COMPLICATIONS[complication].rules
+    return [rule.factor for bit, rule in enumerate(rules) if bitmask >> bit & 1]
+
+
+def score_cohort(columns: Mapping[str, np.ndarray]) -> CohortScores:
+    """Score every patient in ``columns`` (float arrays, NaN for missing) at once.
+
+    ``retinal_graded`` is 1 for a graded retinal image and 0 otherwise; any
+    column left out counts as missing (and ``retinal_graded`` as ungraded).
+    """
+    size = len(next(iter(columns.values())))
+    data = {name: np.asarray(columns[name], dtype=np.float64) for name in columns}
+    for name in COLUMNS:
+        if name not in data:
+            data[name] = np.zeros(size) if name == "retinal_graded" else np.full(size, np.nan)
+
+    comparisons: dict[tuple[str, str, float], np.ndarray] = {}
+    scores, levels, factors = {}, {}, {}
+    for name, complication in COMPLICATIONS.items():
+        score = np.full(size, complication.base)
+        bitmask = np.zeros(size, dtype=np.uint8)
+        previous: Optional[np.ndarray] = None
+        for bit, rule in enumerate(complication.rules):
+            key = (rule.column, rule.op, rule.threshold)
+            if key not in comparisons:
+                comparisons[key] = _OPS[rule.op](data[rule.column], rule.threshold)
+            fired = comparisons[key]
+            if rule.otherwise and previous is not None:
+                fired = fired & ~previous
+            if rule.points:
+                score += fired * rule.points
+            bitmask |= fired.astype(np.uint8) << bit
+            previous = fired
+        np.clip(score, 0.0, 100.0, out=score)
+        scores[name] = score
+        levels[name] = np.searchsorted(LEVEL_THRESHOLDS, score, side="right").astype(np.uint8)
+        factors[name] = bitmask
+    return CohortScores(scores=scores, levels=levels, factors=factors)
+
+
+def columns_from(
+    labs: Sequence[LabValues],
+    retinal: Optional[Sequence[Optional[RetinalResult]]] = None,
+    cognitive: Optional[Sequence[Optional[CognitiveResult]]] = None,
+) -> dict[str, np.ndarray]:
+    """Columns for ``score_cohort`` from the per-patient objects ``RiskScorer.score`` takes."""
+    columns = {
+        name: np.array([getattr(item, name) for item in labs], dtype=np.float64)
+        for name in COLUMNS[:5]
+    }
+    retinal = retinal or [None] * len(labs)
+    cognitive = cognitive or [None] * len(labs)
+    columns["cognitive_score"] = np.array(
+        [item.score if item is not None else None for item in cognitive], dtype=np.float64
+    )
+    columns["retinal_graded"] = np.array(
+        [item is not None and item.grade not in {"Unknown", "Not Analyzed"} for item in retinal],
+        dtype=np.float64,
+    )
+    return columns
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import gzip
+import json
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from time import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from app import config
+from app.storage import SQLiteStore
+
+_VACUUM_PAGES = 256
+
+
+class HistoryArchive:
+    """Moves analyses past the retention window into monthly, append-only archive segments.
+
+    A segment (``history-YYYY-MM.ndjson.gz``) is a series of gzip members, one
+    per compaction batch, so ``zcat`` reads it whole and a single analysis is
+    found by decompressing only its member. The store records each member and
+    deletes its rows in one transaction after the member is on disk. Bytes past
+    the last recorded member are left by an interrupted run and are cut off
+    before the next append, so a row is never archived twice.
+    """
+
+    def __init__(
+        self,
+        store: SQLiteStore,
+        directory: str | None = None,
+        retention_days: int | None = None,
+        batch_size: int | None = None,
+        interval_s: float | None = None,
+    ) -> None:
+        self.store = store
+        self.directory = Path(directory or config.HISTORY_ARCHIVE_DIR)
+        self.retention_days = config.HISTORY_RETENTION_DAYS if retention_days is None else retention_days
+        self.batch_size = max(1, batch_size or config.HISTORY_COMPACTION_BATCH)
+        self.interval_s = interval_s or config.HISTORY_COMPACTION_INTERVAL_S
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._last_run: Dict[str, Any] = {}
+
+    def start(self) -> None:
+        if self.retention_days <= 0:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="history-compaction", daemon=True)
+        self._thread.start()
+
+    def shutdown(self) -> None:
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def compact(self) -> int:
+        """Archive every analysis older than the retention window, then vacuum; the number moved."""
+        if self.retention_days <= 0:
+            return 0
+        started = time()
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=self.retention_days)).strftime("%Y-%m-%d %H:%M:%S")
+        moved = 0
+        with self._lock:
+            while not self._stopping.is_set():
+                rows = self.store.fetch_expired(cutoff, self.batch_size)
+                if not rows:
+                    break
+                by_month: Dict[str, List[Dict[str, Any]]] = {}
+                for row in rows:
+                    by_month.setdefault(row["created_at"][:7], []).append(row)
+                for month, month_rows in by_month.items():
+                    self._archive(f"history-{month}.ndjson.gz", month_rows)
+                moved += len(rows)
+                # Writers take the lock between batches.
+                self._stopping.wait(0.01)
+        free_pages = self._vacuum()
+        self._last_run = {
+            "finished_at": _now(),
+            "archived": moved,
+            "duration_ms": int((time() - started) * 1000),
+            "free_pages": free_pages,
+        }
+        return moved
+
+    def fetch(self, analysis_id: int, fields: Optional[Sequence[str]] = None) -> Optional[Dict[str, Any]]:
+        location = self.store.archive_location(analysis_id)
+        if location is None:
+            return None
+        segment, offset, length = location
+        for row in self.read_member(segment, offset, length):
+            if row["id"] == analysis_id:
+                return SQLiteStore.project(row, fields)
+        return None  # pragma: no cover - index and segment disagree
+
+    def stats(self) -> dict:
+        members = self.store.archive_members()
+        segments = {member["segment"] for member in members}
+        return {
+            "retention_days": self.retention_days,
+            "segments": len(segments),
+            "archived_rows": sum(member["rows"] for member in members),
+            "archived_bytes": sum(member["length"] for member in members),
+            "last_run": self._last_run or None,
+        }
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                self.compact()
+            except Exception as exc:  # pragma: no cover - reported through stats, retried next interval
+                self._last_run = {"failed_at": _now(), "error": str(exc)}
+            self._stopping.wait(self.interval_s)
+
+    def _archive(self, segment: str, rows: List[Dict[str, Any]]) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / segment
+        committed = sum(member["length"] for member in self.store.archive_members(segment))
+        payload = gzip.compress("".join(json.dumps(row) + "\n" for row in rows).encode("utf-8"))
+        with open(path, "r+b" if path.exists() else "w+b") as handle:
+            handle.truncate(committed)
+            handle.seek(committed)
+            handle.write(payload)
+            handle.flush()
+            os.fsync(handle.fileno())
+        member = {
+            "segment": segment,
+            "offset": committed,
+            "length": len(payload),
+            "rows": len(rows),
+            "first_created_at": min(row["created_at"] for row in rows),
+            "last_created_at": max(row["created_at"] for row in rows),
+        }
+        self.store.commit_archived(member, [row["id"] for row in rows])
+
+    def read_member(self, segment: str, offset: int, length: int) -> List[Dict[str, Any]]:
+        with open(self.directory / segment, "rb") as handle:
+            handle.seek(offset)
+            data = gzip.decompress(handle.read(length))
+        return [json.loads(line) for line in data.splitlines()]
+
+    def _vacuum(self) -> int:
+        free_pages = self.store.incremental_vacuum(_VACUUM_PAGES)
+        while free_pages and not self._stopping.is_set():
+            self._stopping.wait(0.01)
+            free_pages = self.store.incremental_vacuum(_VACUUM_PAGES)
+        return free_pages
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
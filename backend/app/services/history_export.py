@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+from datetime import date, timedelta
+from typing import Iterator, Optional, Sequence
+
+from app.services.history_archive import HistoryArchive
+from app.storage import ANALYSIS_FIELDS, SQLiteStore
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def export_history(
+    store: SQLiteStore,
+    fmt: str,
+    fields: Optional[Sequence[str]] = None,
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    chunk_size: int = 500,
+    archive: Optional[HistoryArchive] = None,
+) -> Iterator[bytes]:
+    """Encoded export of the history, one chunk of rows per yielded block.
+
+    ``until`` is inclusive, and archived analyses come first when an
+    ``archive`` is given. In CSV, each field is a column holding its JSON.
+    Only one chunk of rows is decoded at a time, so memory does not grow with
+    the table. Unknown fields raise ``ValueError`` here, before anything is
+    streamed.
+    """
+    unknown = set(fields or ()) - ANALYSIS_FIELDS.keys()
+    if unknown:
+        raise ValueError(f"Unknown history fields: {', '.join(sorted(unknown))}")
+    if fmt not in MEDIA_TYPES:
+        raise ValueError(f"Unknown export format: {fmt}")
+    chunks = store.iter_history(
+        fields=fields,
+        since=since.isoformat() if since else None,
+        until=(until + timedelta(days=1)).isoformat() if until else None,
+        chunk_size=chunk_size,
+        read_member=archive.read_member if archive is not None else None,
+    )
+    return _ndjson(chunks) if fmt == "ndjson" else _csv(chunks, fields)
+
+
+def _ndjson(chunks: Iterator[list[dict]]) -> Iterator[bytes]:
+    for rows in chunks:
+        yield "".join(json.dumps(row) + "\n" for row in rows).encode("utf-8")
+
+
+def _csv(chunks: Iterator[list[dict]], fields: Optional[Sequence[str]]) -> Iterator[bytes]:
+    columns = ["id", "created_at", "patient_id", *(fields if fields is not None else ANALYSIS_FIELDS)]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in chunks:
+        for row in rows:
+            writer.writerow([row["id"], row["created_at"], row["patient_id"], *(json.dumps(row[name]) for name in columns[3:])])
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
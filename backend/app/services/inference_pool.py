@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from typing import Any, Callable
+
+from app import config
+from app.services.metrics import INFERENCE_QUEUE_WAIT, INFERENCE_QUEUED, INFERENCE_REJECTED, INFERENCE_RUNNING
+
+
+class PoolSaturatedError(RuntimeError):
+    def __init__(self, retry_after_s: int) -> None:
+        super().__init__("Inference queue is full. Retry later.")
+        self.retry_after_s = retry_after_s
+
+
+class InferencePool:
+    """Runs blocking pipeline work off the event loop with a bounded backlog.
+
+    Up to ``workers`` jobs execute at once and at most ``queue_size`` more may
+    wait; anything beyond that is rejected immediately so callers can answer
+    with a Retry-After instead of piling up behind a slow model.
+    """
+
+    def __init__(self, workers: int | None = None, queue_size: int | None = None) -> None:
+        self.workers = max(1, workers if workers is not None else config.INFERENCE_WORKERS)
+        self.queue_size = max(0, queue_size if queue_size is not None else config.INFERENCE_QUEUE_SIZE)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        INFERENCE_RUNNING.set_function(lambda: self.stats()["running"])
+        INFERENCE_QUEUED.set_function(lambda: self.stats()["queued"])
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> "asyncio.Future[tuple[Any, int]]":
+        """Queue ``fn`` and return a future resolving to ``(result, queue_wait_ms)``.
+
+        Raises ``PoolSaturatedError`` synchronously when the backlog is full.
+        Must be called from within a running event loop.
+        """
+        with self._lock:
+            if self._pending >= self.workers + self.queue_size:
+                INFERENCE_REJECTED.inc()
+                raise PoolSaturatedError(config.QUEUE_RETRY_AFTER_S)
+            self._pending += 1
+
+        submitted = perf_counter()
+
+        def task() -> tuple[Any, int]:
+            waited = perf_counter() - submitted
+            INFERENCE_QUEUE_WAIT.observe(waited)
+            queue_wait_ms = int(waited * 1000)
+            with self._lock:
+                self._running += 1
+            try:
+                return fn(*args, **kwargs), queue_wait_ms
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._pending -= 1
+
+        loop = asyncio.get_running_loop()
+        try:
+            return loop.run_in_executor(self._executor, task)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "running": self._running,
+                "queued": self._pending - self._running,
+            }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
@@ -2,109 +2,252 @@ from __future__ import annotations
 
 import io
 import re
+import subprocess
+from dataclasses import dataclass
+from time import perf_counter
 from typing import Tuple
 
-from pdf2image import convert_from_bytes
 from PIL import Image
 import pytesseract
 
+from app import config
 from app.schemas import LabParseResult, LabValues
+from app.services import tracing
+from app.services.metrics import OCR_PAGE_DURATION, OCR_PAGES
+from app.services.ocr_pool import OCRWorkerPool
+from app.services.parse_cache import ParseResultCache
+
+
+# Bump whenever a change alters parse output so cached results from older parsers are not served.
+PARSER_VERSION = 1
+
+_WHITESPACE = re.compile(r"\s+")
+_DECIMAL = r"(\d+(?:\.\d+)?)"
+
+
+@dataclass(frozen=True)
+class FieldRule:
+    """How one analyte is recognised on a line: any label, then the first value."""
+
+    field: str
+    labels: tuple[str, ...]
+    value_pattern: str
+    units: tuple[str, ...] = ()
+
+
+FIELD_RULES: tuple[FieldRule, ...] = (
+    FieldRule("a1c", (r"\ba1c\b", r"hemoglobin a1c", r"hba1c"), r"(\d+(?:\.\d+)?)\s*%?", (r"%",)),
+    FieldRule(
+        "fasting_glucose",
+        (r"fasting glucose", r"glucose, fasting", r"\bfpg\b"),
+        _DECIMAL,
+        (r"mg/dl", r"mmol/l"),
+    ),
+    FieldRule("egfr", (r"\begfr\b", r"estimated gfr"), _DECIMAL, (r"ml/min", r"ml/min/1\.73", r"ml/min/1\.73m2")),
+    FieldRule("creatinine", (r"creatinine", r"serum creatinine"), _DECIMAL, (r"mg/dl", r"umol/l")),
+    FieldRule("ldl", (r"\bldl\b", r"ldl cholesterol"), _DECIMAL, (r"mg/dl", r"mmol/l")),
+    FieldRule("hdl", (r"\bhdl\b", r"hdl cholesterol"), _DECIMAL, (r"mg/dl", r"mmol/l")),
+    FieldRule("triglycerides", (r"triglycerides", r"\btg\b"), _DECIMAL, (r"mg/dl", r"mmol/l")),
+    FieldRule(
+        "urine_albumin",
+        (r"albumin/creatinine ratio", r"urine albumin", r"\bacr\b"),
+        _DECIMAL,
+        (r"mg/g", r"mg\/g", r"mg/mmol"),
+    ),
+)
+BP_LABEL = r"\b(bp|blood pressure)\b"
+BP_VALUE = r"(\d{2,3})\s*/\s*(\d{2,3})"
+
+
+class LabValueExtractor:
+    """Single-pass extraction of every analyte from OCR text.
+
+    All regexes are compiled once. A combined label alternation rejects raw
+    lines that mention no analyte before any normalisation work; the remaining
+    lines are checked only against the analytes that are still unresolved.
+    Each analyte takes its value from the first line that carries both a label
+    and a value, and the scan stops early once every analyte is resolved.
+    """
+
+    def __init__(self, rules: tuple[FieldRule, ...] = FIELD_RULES) -> None:
+        self._rules = [
+            (
+                rule.field,
+                re.compile("|".join(rule.labels), re.IGNORECASE),
+                re.compile(self._value_regex(rule), re.IGNORECASE),
+            )
+            for rule in rules
+        ]
+        self._bp_label = re.compile(BP_LABEL, re.IGNORECASE)
+        self._bp_value = re.compile(BP_VALUE)
+        # Runs on raw lines, so a space inside a label has to accept any whitespace run.
+        all_labels = [label.replace(" ", r"\s+") for rule in rules for label in rule.labels] + [BP_LABEL]
+        self._any_label = re.compile("|".join(f"(?:{label})" for label in all_labels), re.IGNORECASE)
+
+    @staticmethod
+    def _value_regex(rule: FieldRule) -> str:
+        if not rule.units:
+            return rule.value_pattern
+        return rule.value_pattern + r"(?:\s*(?:" + "|".join(rule.units) + r"))?"
+
+    def extract(self, text: str) -> dict[str, float]:
+        found: dict[str, float] = {}
+        pending = list(self._rules)
+        bp_pending = True
+
+        for raw_line in text.splitlines():
+            if not pending and not bp_pending:
+                break
+            if not self._any_label.search(raw_line):
+                continue
+            line = _WHITESPACE.sub(" ", raw_line).strip()
+
+            still_pending = []
+            for rule in pending:
+                field, label, value = rule
+                match = value.search(line) if label.search(line) else None
+                if match:
+                    found[field] = float(match.group(1))
+                else:
+                    still_pending.append(rule)
+            pending = still_pending
+
+            if bp_pending and self._bp_label.search(line):
+                match = self._bp_value.search(line)
+                if match:
+                    found["systolic_bp"] = float(match.group(1))
+                    found["diastolic_bp"] = float(match.group(2))
+                    bp_pending = False
+
+        return found
+
+    def has_label(self, text: str) -> bool:
+        return self._any_label.search(text) is not None
+
+
+_EXTRACTION_ENGINE = LabValueExtractor()
+
+
+def pdf_text_layer(file_bytes: bytes) -> list[str]:
+    """Embedded text of each page via poppler's ``pdftotext``; empty when there is none to read."""
+    try:
+        completed = subprocess.run(
+            ["pdftotext", "-layout", "-enc", "UTF-8", "-", "-"],
+            input=file_bytes,
+            capture_output=True,
+            timeout=30,
+            check=True,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return []
+    pages = completed.stdout.decode("utf-8", errors="replace").split("\f")
+    # pdftotext terminates every page with a form feed, leaving one empty trailing chunk.
+    return pages[:-1] if len(pages) > 1 else pages
 
 
 class LabParser:
+    def __init__(self, ocr_pool: OCRWorkerPool | None = None, cache: ParseResultCache | None = None) -> None:
+        self.ocr_pool = ocr_pool or OCRWorkerPool.instance()
+        self.cache = cache
+
     def parse(self, filename: str, file_bytes: bytes) -> LabParseResult:
-        text = self._extract_text(filename, file_bytes)
-        values, missing, flags = self._extract_values(text)
-        return LabParseResult(values=values, raw_text=text, missing_fields=missing, quality_flags=flags)
+        if self.cache is None:
+            return self._parse(filename, file_bytes)
+        key = self.cache.key(file_bytes, self._cache_params(filename))
+        cached = self.cache.get(key)
+        tracing.record_cache(cached is not None)
+        if cached is not None:
+            return cached
+        result = self._parse(filename, file_bytes)
+        self.cache.put(key, result)
+        return result
+
+    def _cache_params(self, filename: str) -> dict:
+        is_pdf = filename.lower().endswith(".pdf")
+        params = {"version": PARSER_VERSION, "pdf": is_pdf}
+        if is_pdf:
+            params.update(
+                text_layer=config.PDF_TEXT_LAYER,
+                text_min_chars=config.PDF_TEXT_MIN_CHARS,
+                dpi=config.OCR_DPI,
+                max_pages=config.OCR_MAX_PAGES,
+                grayscale=config.OCR_GRAYSCALE,
+            )
+        return params
+
+    def _parse(self, filename: str, file_bytes: bytes) -> LabParseResult:
+        text, text_flags = self._extract_text(filename, file_bytes)
+        with tracing.span("extract_values"):
+            values, missing, flags = self._extract_values(text)
+        return LabParseResult(
+            values=values, raw_text=text, missing_fields=missing, quality_flags=flags + text_flags
+        )
 
-    def _extract_text(self, filename: str, file_bytes: bytes) -> str:
+    def _extract_text(self, filename: str, file_bytes: bytes) -> Tuple[str, list[str]]:
         lowered = filename.lower()
         if lowered.endswith(".pdf"):
-            pages = convert_from_bytes(file_bytes)
-            return "\n".join(self._ocr_image(page) for page in pages)
+            return self._extract_pdf_text(file_bytes)
         image = Image.open(io.BytesIO(file_bytes))
-        return self._ocr_image(image)
+        return self._ocr_image(image), ["text_source_ocr"]
+
+    def _extract_pdf_text(self, file_bytes: bytes) -> Tuple[str, list[str]]:
+        with tracing.span("text_layer"):
+            embedded = pdf_text_layer(file_bytes) if config.PDF_TEXT_LAYER else []
+        usable = [len(page.strip()) >= config.PDF_TEXT_MIN_CHARS for page in embedded]
+        # A layer without a single analyte label is usually a scan with junk OCR text behind it.
+        if not any(ok and _EXTRACTION_ENGINE.has_label(page) for ok, page in zip(usable, embedded)):
+            usable = [False] * len(embedded)
+
+        flags: list[str] = []
+        ocr_text: dict[int, str] = {}
+        if not embedded or not all(usable):
+            ocr_pages = [number for number, ok in enumerate(usable, start=1) if not ok] if embedded else None
+            with tracing.span("ocr"):
+                document = self.ocr_pool.ocr_pdf(file_bytes, pages=ocr_pages)
+            ocr_text = document.by_page()
+            tracing.record_detail(
+                "ocr_pages",
+                [
+                    {"page": t.page, "rasterize_ms": t.rasterize_ms, "ocr_ms": t.ocr_ms, "raster_kb": t.raster_kb}
+                    for t in document.timings
+                ],
+            )
+            if document.truncated:
+                flags.append("pdf_pages_truncated")
+        tracing.record_detail("text_layer_pages", sum(usable))
+
+        if not embedded:
+            flags.append("text_source_ocr")
+            return "\n".join(ocr_text.values()), flags
+
+        pages = [
+            page if ok else ocr_text.get(number, "")
+            for number, (ok, page) in enumerate(zip(usable, embedded), start=1)
+        ]
+        if all(usable):
+            flags.append("text_source_embedded")
+        elif any(usable):
+            flags.append("text_source_mixed")
+        else:
+            flags.append("text_source_ocr")
+        return "\n".join(pages), flags
 
     def _ocr_image(self, image: Image.Image) -> str:
-        return pytesseract.image_to_string(image)
+        started = perf_counter()
+        with tracing.span("ocr"):
+            text = pytesseract.image_to_string(image)
+        OCR_PAGES.inc(source="image")
+        OCR_PAGE_DURATION.observe(perf_counter() - started, phase="ocr")
+        return text
 
     def _extract_values(self, text: str) -> Tuple[LabValues, list[str], list[str]]:
         values = LabValues()
         missing: list[str] = []
         flags: list[str] = []
 
-        lines = [self._normalize_line(line) for line in text.splitlines() if line.strip()]
-
-        def find_value(labels: list[str], value_pattern: str, units: list[str] | None = None) -> float | None:
-            for line in lines:
-                if not any(re.search(label, line, re.IGNORECASE) for label in labels):
-                    continue
-                pattern = value_pattern
-                if units:
-                    unit_pattern = r"(?:\s*(?:" + "|".join(units) + r"))?"
-                    pattern = value_pattern + unit_pattern
-                match = re.search(pattern, line, re.IGNORECASE)
-                if match:
-                    return float(match.group(1))
-            return None
-
-        def find_bp() -> tuple[float | None, float | None]:
-            for line in lines:
-                if not re.search(r"\b(bp|blood pressure)\b", line, re.IGNORECASE):
-                    continue
-                match = re.search(r"(\d{2,3})\s*/\s*(\d{2,3})", line)
-                if match:
-                    return float(match.group(1)), float(match.group(2))
-            return None, None
-
-        values.a1c = find_value(
-            labels=[r"\ba1c\b", r"hemoglobin a1c", r"hba1c"],
-            value_pattern=r"(\d+(?:\.\d+)?)\s*%?",
-            units=[r"%"],
-        )
-        values.fasting_glucose = find_value(
-            labels=[r"fasting glucose", r"glucose, fasting", r"\bfpg\b"],
-            value_pattern=r"(\d+(?:\.\d+)?)",
-            units=[r"mg/dl", r"mmol/l"],
-        )
-        values.egfr = find_value(
-            labels=[r"\begfr\b", r"estimated gfr"],
-            value_pattern=r"(\d+(?:\.\d+)?)",
-            units=[r"ml/min", r"ml/min/1\.73", r"ml/min/1\.73m2"],
-        )
-        values.creatinine = find_value(
-            labels=[r"creatinine", r"serum creatinine"],
-            value_pattern=r"(\d+(?:\.\d+)?)",
-            units=[r"mg/dl", r"umol/l"],
-        )
-        values.ldl = find_value(
-            labels=[r"\bldl\b", r"ldl cholesterol"],
-            value_pattern=r"(\d+(?:\.\d+)?)",
-            units=[r"mg/dl", r"mmol/l"],
-        )
-        values.hdl = find_value(
-            labels=[r"\bhdl\b", r"hdl cholesterol"],
-            value_pattern=r"(\d+(?:\.\d+)?)",
-            units=[r"mg/dl", r"mmol/l"],
-        )
-        values.triglycerides = find_value(
-            labels=[r"triglycerides", r"\btg\b"],
-            value_pattern=r"(\d+(?:\.\d+)?)",
-            units=[r"mg/dl", r"mmol/l"],
-        )
-        values.urine_albumin = find_value(
-            labels=[
-                r"albumin/creatinine ratio",
-                r"urine albumin",
-                r"\bacr\b",
-            ],
-            value_pattern=r"(\d+(?:\.\d+)?)",
-            units=[r"mg/g", r"mg\/g", r"mg/mmol"],
-        )
-
-        systolic, diastolic = find_bp()
-        values.systolic_bp = systolic
-        values.diastolic_bp = diastolic
+        found = _EXTRACTION_ENGINE.extract(text)
+        for field_name, value in found.items():
+            setattr(values, field_name, value)
 
         self._add_range_flags(values, flags)
 
@@ -117,9 +260,6 @@ class LabParser:
 
         return values, missing, flags
 
-    def _normalize_line(self, line: str) -> str:
-        return re.sub(r"\s+", " ", line).strip()
-
     def _add_range_flags(self, values: LabValues, flags: list[str]) -> None:
         ranges = {
             "a1c": (3.0, 15.0),
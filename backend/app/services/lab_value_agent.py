@@ -5,10 +5,18 @@ from typing import List
 
 from app import config
 from app.schemas import LabInsights, LabValues
-from app.services.llm import TextLLM
+from app.services.llm import StopRule, TextLLM
 
 
 class LabValueAgent:
+    PROMPT_PREFIX = (
+        "You are a lab interpretation assistant for diabetes care. "
+        "Given these lab values, produce a concise summary and 2-3 highlights. "
+        "Return format: Summary: <sentence> | Highlights: <item1>; <item2>; <item3>.\n"
+    )
+    # Done once the highlights line has been completed.
+    STOP = StopRule(r"highlights?[ \t]*[:\-]?[ \t]*\S[^\n]*\n")
+
     def __init__(self) -> None:
         self.llm = TextLLM()
 
@@ -17,15 +25,13 @@ class LabValueAgent:
             return LabInsights(summary="Lab Value Agent disabled.", flags=["lab_agent_disabled"])
 
         prompt = self._prompt(values)
-        lines = self.llm.generate_lines(prompt, max_new_tokens=192)
+        lines = self.llm.generate_lines(prompt, max_new_tokens=192, prefix=self.PROMPT_PREFIX, stop=self.STOP)
         return self._parse(lines)
 
     def _prompt(self, values: LabValues) -> str:
         return (
-            "You are a lab interpretation assistant for diabetes care. "
-            "Given these lab values, produce a concise summary and 2-3 highlights. "
-            "Return format: Summary: <sentence> | Highlights: <item1>; <item2>; <item3>.\n"
-            f"A1C: {values.a1c}\n"
+            self.PROMPT_PREFIX
+            + f"A1C: {values.a1c}\n"
             f"Fasting glucose: {values.fasting_glucose}\n"
             f"eGFR: {values.egfr}\n"
             f"Creatinine: {values.creatinine}\n"
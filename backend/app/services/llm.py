@@ -1,31 +1,390 @@
 from __future__ import annotations
 
-from typing import List
+import copy
+import queue
+import re
+import threading
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from time import monotonic, perf_counter
+from typing import List, Optional, Sequence
 
 import torch
+from transformers import DynamicCache, StoppingCriteria, StoppingCriteriaList
 
+from app import config
+from app.services import tracing
+from app.services.llm_cache import LLMResultCache
+from app.services.metrics import (
+    LLM_CACHE_REQUESTS,
+    LLM_GENERATED_TOKENS,
+    LLM_GENERATION_DURATION,
+    LLM_PROMPT_TOKENS,
+    LLM_TOKENS_PER_SECOND,
+)
 from app.services.model_registry import ModelRegistry
 
 
-class TextLLM:
+class ThroughputStats:
+    """Generation counters for /api/stats, mirrored into the /metrics registry under ``mode``."""
+
+    def __init__(self, mode: str = "") -> None:
+        self.mode = mode
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.prompts = 0
+        self.generated_tokens = 0
+        self.seconds = 0.0
+
+    def record(self, prompts: int, prompt_tokens: int, generated_tokens: int, seconds: float) -> None:
+        with self._lock:
+            self.calls += 1
+            self.prompts += prompts
+            self.generated_tokens += generated_tokens
+            self.seconds += seconds
+        if self.mode:
+            LLM_PROMPT_TOKENS.inc(prompt_tokens, mode=self.mode)
+            LLM_GENERATED_TOKENS.inc(generated_tokens, mode=self.mode)
+            LLM_GENERATION_DURATION.observe(seconds, mode=self.mode)
+            if seconds > 0:
+                LLM_TOKENS_PER_SECOND.set(generated_tokens / seconds, mode=self.mode)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "prompts": self.prompts,
+                "generated_tokens": self.generated_tokens,
+                "avg_batch_size": round(self.prompts / self.calls, 2) if self.calls else 0.0,
+                "tokens_per_s": round(self.generated_tokens / self.seconds, 2) if self.seconds else 0.0,
+            }
+
+
+@dataclass(frozen=True)
+class StopRule:
+    """Stop once ``pattern`` has matched ``count`` times in the generated text."""
+
+    pattern: str
+    count: int = 1
+
+    def satisfied(self, text: str) -> bool:
+        matches = re.finditer(self.pattern, text, re.IGNORECASE | re.MULTILINE)
+        return sum(1 for _ in zip(range(self.count), matches)) >= self.count
+
+
+class FormatStoppingCriteria(StoppingCriteria):
+    """Per-row stop rules checked against the newly generated tokens only.
+
+    Like ``TextStreamer``, each step decodes only the tokens since the last
+    completed line and keeps the lines before it as text, so a check costs
+    one line rather than the whole generation.
+    """
+
+    def __init__(self, tokenizer, prompt_length: int, rules: Sequence[Optional[StopRule]]) -> None:
+        self.tokenizer = tokenizer
+        self.prompt_length = prompt_length
+        self.rules = list(rules)
+        self._done = [False] * len(self.rules)
+        self._lines = [""] * len(self.rules)
+        self._line_start = [prompt_length] * len(self.rules)
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        for index, rule in enumerate(self.rules):
+            if rule is None or self._done[index]:
+                continue
+            tail = self.tokenizer.decode(input_ids[index, self._line_start[index]:], skip_special_tokens=True)
+            self._done[index] = rule.satisfied(self._lines[index] + tail)
+            if tail.endswith("\n"):
+                self._lines[index] += tail
+                self._line_start[index] = input_ids.shape[1]
+        return torch.tensor(self._done, dtype=torch.bool, device=input_ids.device)
+
+
+def stopping_criteria(
+    tokenizer, prompt_length: int, rules: Sequence[Optional[StopRule]]
+) -> Optional[StoppingCriteriaList]:
+    if not any(rules):
+        return None
+    return StoppingCriteriaList([FormatStoppingCriteria(tokenizer, prompt_length, rules)])
+
+
+class PrefixKVCache:
+    """Keeps the past-key-values of each agent's fixed prompt preamble.
+
+    Generation resumes from a copy of the cached prefix so prefill only covers
+    the per-patient suffix.
+    """
+
+    max_prefixes = 16
+
     def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._prefixes: dict[str, tuple[torch.Tensor, DynamicCache]] = {}
+
+    def generate(
+        self,
+        tokenizer,
+        model,
+        prefix: str,
+        prompt: str,
+        max_new_tokens: int,
+        stop: Optional[StopRule] = None,
+    ) -> tuple[torch.Tensor, int]:
+        """Return ``(output_ids, prompt_length)`` for ``prompt``, which must start with ``prefix``."""
+        device = next(model.parameters()).device
+        prefix_ids, prefix_cache = self._get(tokenizer, model, prefix, device)
+        suffix_ids = tokenizer(prompt[len(prefix):], return_tensors="pt", add_special_tokens=False)["input_ids"]
+        input_ids = torch.cat([prefix_ids, suffix_ids.to(device)], dim=1)
+        with torch.no_grad():
+            output_ids = model.generate(
+                input_ids=input_ids,
+                attention_mask=torch.ones_like(input_ids),
+                past_key_values=copy.deepcopy(prefix_cache),
+                max_new_tokens=max_new_tokens,
+                do_sample=False,
+                temperature=0.0,
+                stopping_criteria=stopping_criteria(tokenizer, input_ids.shape[1], [stop]),
+            )
+        return output_ids, input_ids.shape[1]
+
+    def _get(self, tokenizer, model, prefix: str, device) -> tuple[torch.Tensor, DynamicCache]:
+        with self._lock:
+            cached = self._prefixes.get(prefix)
+            if cached is not None:
+                return cached
+            prefix_ids = tokenizer(prefix, return_tensors="pt")["input_ids"].to(device)
+            prefix_cache = DynamicCache()
+            with torch.no_grad():
+                model(input_ids=prefix_ids, past_key_values=prefix_cache, use_cache=True)
+            if len(self._prefixes) >= self.max_prefixes:
+                self._prefixes.pop(next(iter(self._prefixes)))
+            self._prefixes[prefix] = (prefix_ids, prefix_cache)
+            return prefix_ids, prefix_cache
+
+
+prefix_kv_cache = PrefixKVCache()
+
+
+@dataclass
+class GenerationRequest:
+    prompt: str
+    max_new_tokens: int
+    prefix: Optional[str] = None
+    stop: Optional[StopRule] = None
+    future: Future = field(default_factory=Future)
+
+
+class GenerationBatcher:
+    """Collects prompts from concurrent callers and runs them as one left-padded batch."""
+
+    _instance: Optional["GenerationBatcher"] = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, max_batch_size: int | None = None, max_wait_ms: int | None = None) -> None:
         self.registry = ModelRegistry.instance()
+        self.max_batch_size = max(1, max_batch_size or config.LLM_MAX_BATCH_SIZE)
+        self.max_wait_s = max(0, max_wait_ms if max_wait_ms is not None else config.LLM_MAX_BATCH_WAIT_MS) / 1000
+        self.stats = ThroughputStats("batched")
+        self._queue: "queue.Queue[GenerationRequest]" = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name="llm-batcher", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def instance(cls) -> "GenerationBatcher":
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
 
-    def generate(self, prompt: str, max_new_tokens: int = 512) -> str:
+    def submit(
+        self,
+        prompt: str,
+        max_new_tokens: int,
+        prefix: Optional[str] = None,
+        stop: Optional[StopRule] = None,
+    ) -> str:
+        request = GenerationRequest(prompt=prompt, max_new_tokens=max_new_tokens, prefix=prefix, stop=stop)
+        self._queue.put(request)
+        return request.future.result()
+
+    def _loop(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = monotonic() + self.max_wait_s
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._run_batch(batch)
+
+    def _run_batch(self, batch: list[GenerationRequest]) -> None:
+        try:
+            if len(batch) == 1 and batch[0].prefix:
+                # A lone prompt gains nothing from padding; resume from its cached prefix instead.
+                decoded = [self._generate_with_prefix(batch[0])]
+            else:
+                decoded = self._generate(batch)
+        except Exception as exc:  # pragma: no cover - surfaced to every caller in the batch
+            for item in batch:
+                item.future.set_exception(exc)
+            return
+        for item, text in zip(batch, decoded):
+            item.future.set_result(text)
+
+    def _generate(self, batch: list[GenerationRequest]) -> list[str]:
+        prompts = [item.prompt for item in batch]
+        max_new_tokens = [item.max_new_tokens for item in batch]
         tokenizer, model = self.registry.load_medgemma_text()
         device = next(model.parameters()).device
 
-        inputs = tokenizer(prompt, return_tensors="pt").to(device)
+        started = perf_counter()
+        # Per call: the tokenizer is shared with the single-prompt, prefix and warmup paths.
+        inputs = tokenizer(prompts, return_tensors="pt", padding=True, padding_side="left").to(device)
+        prompt_width = inputs["input_ids"].shape[1]
         with torch.no_grad():
             output_ids = model.generate(
                 **inputs,
-                max_new_tokens=max_new_tokens,
+                max_new_tokens=max(max_new_tokens),
                 do_sample=False,
                 temperature=0.0,
+                pad_token_id=tokenizer.pad_token_id,
+                stopping_criteria=stopping_criteria(tokenizer, prompt_width, [item.stop for item in batch]),
             )
-        decoded = tokenizer.decode(output_ids[0], skip_special_tokens=True)
+
+        # Rows share the padded prompt width; each caller only gets the new tokens it asked for.
+        decoded: list[str] = []
+        generated_tokens = 0
+        for row, limit in zip(output_ids, max_new_tokens):
+            new_tokens = row[prompt_width : prompt_width + limit]
+            generated_tokens += int((new_tokens != tokenizer.pad_token_id).sum())
+            decoded.append(tokenizer.decode(new_tokens, skip_special_tokens=True))
+        prompt_tokens = int(inputs["attention_mask"].sum())
+        self.stats.record(len(prompts), prompt_tokens, generated_tokens, perf_counter() - started)
+        return decoded
+
+    def _generate_with_prefix(self, request: GenerationRequest) -> str:
+        tokenizer, model = self.registry.load_medgemma_text()
+        started = perf_counter()
+        output_ids, prompt_length = prefix_kv_cache.generate(
+            tokenizer, model, request.prefix, request.prompt, request.max_new_tokens, request.stop
+        )
+        self.stats.record(1, prompt_length, output_ids.shape[1] - prompt_length, perf_counter() - started)
+        return tokenizer.decode(output_ids[0, prompt_length:], skip_special_tokens=True)
+
+
+class TextLLM:
+    single_stats = ThroughputStats("single")
+
+    def __init__(self) -> None:
+        self.registry = ModelRegistry.instance()
+
+    def generate(
+        self,
+        prompt: str,
+        max_new_tokens: int = 512,
+        prefix: Optional[str] = None,
+        stop: Optional[StopRule] = None,
+    ) -> str:
+        """Generate a completion for ``prompt`` and return only the new text.
+
+        ``prefix`` names the static leading part of ``prompt``; when prefix caching
+        is enabled its key/values are computed once and reused across calls.
+        ``stop`` ends generation early once the expected output format is complete.
+        """
+        if prefix is not None and (
+            not config.LLM_PREFIX_CACHE or not prompt.startswith(prefix) or len(prompt) == len(prefix)
+        ):
+            prefix = None
+        if not config.LLM_CACHE:
+            return self._generate_uncached(prompt, max_new_tokens, prefix, stop)
+
+        cache = LLMResultCache.instance()
+        params = {
+            "max_new_tokens": max_new_tokens,
+            "do_sample": False,
+            "decode": "new_tokens",
+            "stop": [stop.pattern, stop.count] if stop else None,
+        }
+        key = cache.key(config.MEDGEMMA_MODEL_ID, prompt, params)
+        with tracing.span("cache_lookup"):
+            cached = cache.get(key)
+        tracing.record_cache(cached is not None)
+        LLM_CACHE_REQUESTS.inc(result="hit" if cached is not None else "miss")
+        if cached is not None:
+            return cached
+        text = self._generate_uncached(prompt, max_new_tokens, prefix, stop)
+        cache.put(key, text)
+        return text
+
+    def _generate_uncached(
+        self,
+        prompt: str,
+        max_new_tokens: int,
+        prefix: Optional[str],
+        stop: Optional[StopRule],
+    ) -> str:
+        if config.LLM_BATCHING:
+            # Includes the wait for the batch to fill; the batch itself runs on the batcher thread.
+            with tracing.span("batched_generate"):
+                return GenerationBatcher.instance().submit(prompt, max_new_tokens, prefix, stop)
+        with tracing.span("generate"):
+            return self._generate_single(prompt, max_new_tokens, prefix, stop)
+
+    def _generate_single(
+        self,
+        prompt: str,
+        max_new_tokens: int,
+        prefix: Optional[str] = None,
+        stop: Optional[StopRule] = None,
+    ) -> str:
+        with tracing.span("load_model"):
+            tokenizer, model = self.registry.load_medgemma_text()
+        device = next(model.parameters()).device
+
+        started = perf_counter()
+        if prefix:
+            with tracing.span("prefix_generate"):
+                output_ids, prompt_length = prefix_kv_cache.generate(
+                    tokenizer, model, prefix, prompt, max_new_tokens, stop
+                )
+        else:
+            with tracing.span("tokenize"):
+                inputs = tokenizer(prompt, return_tensors="pt").to(device)
+            prompt_length = inputs["input_ids"].shape[1]
+            with torch.no_grad(), tracing.span("forward"):
+                output_ids = model.generate(
+                    **inputs,
+                    max_new_tokens=max_new_tokens,
+                    do_sample=False,
+                    temperature=0.0,
+                    stopping_criteria=stopping_criteria(tokenizer, prompt_length, [stop]),
+                )
+        with tracing.span("decode"):
+            decoded = tokenizer.decode(output_ids[0, prompt_length:], skip_special_tokens=True)
+        self.single_stats.record(1, prompt_length, output_ids.shape[1] - prompt_length, perf_counter() - started)
         return decoded
 
-    def generate_lines(self, prompt: str, max_new_tokens: int = 512) -> List[str]:
-        text = self.generate(prompt, max_new_tokens=max_new_tokens)
+    def generate_lines(
+        self,
+        prompt: str,
+        max_new_tokens: int = 512,
+        prefix: Optional[str] = None,
+        stop: Optional[StopRule] = None,
+    ) -> List[str]:
+        text = self.generate(prompt, max_new_tokens=max_new_tokens, prefix=prefix, stop=stop)
         return [line.strip() for line in text.splitlines() if line.strip()]
+
+    @classmethod
+    def stats(cls) -> dict:
+        batched = GenerationBatcher._instance
+        return {
+            "batching": config.LLM_BATCHING,
+            "batched": batched.stats.snapshot() if batched else ThroughputStats().snapshot(),
+            "unbatched": cls.single_stats.snapshot(),
+            "cache": LLMResultCache.instance().stats() if config.LLM_CACHE else None,
+        }
@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from time import time
+from typing import Any, Optional
+
+from app import config
+
+
+class LLMResultCache:
+    """Content-addressed cache for greedy (deterministic) generations.
+
+    An in-process LRU tier is always on; a SQLite tier is added when
+    ``LLM_CACHE_DB_PATH`` is set so results survive restarts.
+    """
+
+    _instance: Optional["LLMResultCache"] = None
+    _instance_lock = threading.Lock()
+
+    def __init__(
+        self,
+        max_entries: int | None = None,
+        ttl_s: int | None = None,
+        db_path: str | None = None,
+    ) -> None:
+        self.max_entries = max(1, max_entries or config.LLM_CACHE_MAX_ENTRIES)
+        self.ttl_s = ttl_s if ttl_s is not None else config.LLM_CACHE_TTL_S
+        self._entries: "OrderedDict[str, tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "persistent_hits": 0, "misses": 0, "evictions": 0}
+
+        db_path = db_path if db_path is not None else config.LLM_CACHE_DB_PATH
+        self._conn: Optional[sqlite3.Connection] = None
+        if db_path:
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    created_at REAL NOT NULL,
+                    value TEXT NOT NULL
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_created_at ON llm_cache (created_at)")
+            self._conn.commit()
+
+    @classmethod
+    def instance(cls) -> "LLMResultCache":
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
+
+    @staticmethod
+    def key(model_id: str, prompt: str, params: dict[str, Any]) -> str:
+        payload = json.dumps({"model": model_id, "prompt": prompt, "params": params}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created_at, value = entry
+                if not self._expired(created_at, now):
+                    self._entries.move_to_end(key)
+                    self._counters["hits"] += 1
+                    return value
+                del self._entries[key]
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT created_at, value FROM llm_cache WHERE key = ?",
+                    (key,),
+                ).fetchone()
+                if row is not None and not self._expired(row[0], now):
+                    self._remember(key, row[0], row[1])
+                    self._counters["hits"] += 1
+                    self._counters["persistent_hits"] += 1
+                    return row[1]
+
+            self._counters["misses"] += 1
+            return None
+
+    def put(self, key: str, value: str) -> None:
+        now = time()
+        with self._lock:
+            self._remember(key, now, value)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, created_at, value) VALUES (?, ?, ?)",
+                    (key, now, value),
+                )
+                if self.ttl_s > 0:
+                    self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_s,))
+                self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return {
+                **self._counters,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hit_rate": round(self._counters["hits"] / lookups, 4) if lookups else 0.0,
+                "persistent": self._conn is not None,
+            }
+
+    def _remember(self, key: str, created_at: float, value: str) -> None:
+        self._entries[key] = (created_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return self.ttl_s > 0 and now - created_at > self.ttl_s
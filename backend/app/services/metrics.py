@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import threading
+from bisect import bisect_left
+from typing import Callable, Optional, Sequence
+
+# Seconds; wide enough for a cached lookup and for a cold MedGemma generation.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _escape(value: object) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values: dict[tuple, object] = {}
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels[name] for name in self.label_names)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in sorted(items):
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key: tuple, value) -> list[str]:
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    """A value that goes up and down; ``set_function`` computes it at scrape time instead."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()) -> None:
+        super().__init__(name, help, labels)
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        self._function = function
+
+    def render(self) -> list[str]:
+        if self._function is not None:
+            try:
+                value = self._function()
+            except Exception:  # pragma: no cover - a failing source just drops the sample
+                return []
+            with self._lock:
+                self._values[()] = value
+        return super().render()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> None:
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (not cumulative) counts, then sum and count.
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _render_sample(self, key: tuple, value) -> list[str]:
+        counts, total, count = value
+        lines, cumulative = [], 0
+        for bound, bucket_count in zip((*self.buckets, float("inf")), counts):
+            cumulative += bucket_count
+            labels = _format_labels(self.label_names, key, f'le="{"+Inf" if bound == float("inf") else float(bound)}"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.label_names, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """In-process metrics, rendered in the Prometheus text exposition format.
+
+    Recording takes one short lock per metric, so it is cheap enough for every
+    stage and generation; gauges over existing state use ``set_function`` and
+    cost nothing until scraped.
+    """
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labels))
+
+    def histogram(
+        self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+
+registry = MetricsRegistry()
+
+AGENT_DURATION = registry.histogram(
+    "diarisk_agent_duration_seconds", "Orchestrator stage wall time.", labels=("agent",)
+)
+AGENT_RUNS = registry.counter(
+    "diarisk_agent_runs_total", "Orchestrator stages by outcome (ok, error, skipped).", labels=("agent", "status")
+)
+LLM_PROMPT_TOKENS = registry.counter(
+    "diarisk_llm_prompt_tokens_total", "Prompt tokens sent to MedGemma.", labels=("mode",)
+)
+LLM_GENERATED_TOKENS = registry.counter(
+    "diarisk_llm_generated_tokens_total", "Tokens generated by MedGemma.", labels=("mode",)
+)
+LLM_GENERATION_DURATION = registry.histogram(
+    "diarisk_llm_generation_seconds", "Wall time of one generate call (a whole batch when batched).", labels=("mode",)
+)
+LLM_TOKENS_PER_SECOND = registry.gauge(
+    "diarisk_llm_tokens_per_second", "Generated tokens per second of the latest generate call.", labels=("mode",)
+)
+LLM_CACHE_REQUESTS = registry.counter(
+    "diarisk_llm_cache_requests_total", "LLM result cache lookups by result (hit, miss).", labels=("result",)
+)
+MODEL_LOAD_DURATION = registry.gauge(
+    "diarisk_model_load_seconds", "Duration of the latest load of each model.", labels=("model",)
+)
+MODEL_LOADS = registry.counter(
+    "diarisk_model_loads_total", "Model loads by outcome (loaded, failed).", labels=("model", "status")
+)
+OCR_PAGE_DURATION = registry.histogram(
+    "diarisk_ocr_page_seconds", "Per-page OCR time by phase (rasterize, ocr).", labels=("phase",)
+)
+OCR_PAGES = registry.counter("diarisk_ocr_pages_total", "Pages and images run through OCR.", labels=("source",))
+INFERENCE_RUNNING = registry.gauge("diarisk_inference_in_flight", "Analyses running on the inference pool.")
+INFERENCE_QUEUED = registry.gauge("diarisk_inference_queued", "Analyses waiting for an inference worker.")
+INFERENCE_REJECTED = registry.counter(
+    "diarisk_inference_rejected_total", "Analyses turned away because the inference queue was full."
+)
+INFERENCE_QUEUE_WAIT = registry.histogram(
+    "diarisk_inference_queue_wait_seconds", "Time analyses waited for an inference worker."
+)
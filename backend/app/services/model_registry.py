@@ -1,12 +1,16 @@
 from __future__ import annotations
 
+import threading
+from contextlib import contextmanager
 from dataclasses import dataclass
+from time import perf_counter
 from typing import Optional
 
 import torch
 from transformers import AutoModel, AutoModelForCausalLM, AutoProcessor, AutoTokenizer
 
 from app import config
+from app.services.metrics import MODEL_LOAD_DURATION, MODEL_LOADS
 
 
 @dataclass
@@ -20,14 +24,21 @@ class LoadedModels:
 
 class ModelRegistry:
     _instance: Optional["ModelRegistry"] = None
+    _instance_lock = threading.Lock()
 
     def __init__(self) -> None:
         self.models = LoadedModels()
+        self._medsiglip_lock = threading.Lock()
+        self._medgemma_lock = threading.RLock()
+        self._state_lock = threading.Lock()
+        self.load_state: dict[str, dict] = {}
 
     @classmethod
     def instance(cls) -> "ModelRegistry":
         if cls._instance is None:
-            cls._instance = cls()
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls()
         return cls._instance
 
     def _resolve_device(self) -> str:
@@ -43,60 +54,125 @@ class ModelRegistry:
         if self.models.medsiglip_model is not None and self.models.medsiglip_processor is not None:
             return self.models.medsiglip_processor, self.models.medsiglip_model
 
-        device = self._resolve_device()
-        processor = AutoProcessor.from_pretrained(
-            config.MEDSIGLIP_MODEL_ID,
-            local_files_only=config.OFFLINE_ONLY,
-        )
-        model = AutoModel.from_pretrained(
-            config.MEDSIGLIP_MODEL_ID,
-            local_files_only=config.OFFLINE_ONLY,
-        )
-        model.to(device)
-        model.eval()
-
-        self.models.medsiglip_processor = processor
-        self.models.medsiglip_model = model
-        return processor, model
+        with self._medsiglip_lock:
+            if self.models.medsiglip_model is None or self.models.medsiglip_processor is None:
+                with self._track_load("medsiglip"):
+                    device = self._resolve_device()
+                    processor = AutoProcessor.from_pretrained(
+                        config.MEDSIGLIP_MODEL_ID,
+                        local_files_only=config.OFFLINE_ONLY,
+                    )
+                    model = AutoModel.from_pretrained(
+                        config.MEDSIGLIP_MODEL_ID,
+                        local_files_only=config.OFFLINE_ONLY,
+                    )
+                    model.to(device)
+                    model.eval()
+
+                    self.models.medsiglip_processor = processor
+                    self.models.medsiglip_model = model
+            return self.models.medsiglip_processor, self.models.medsiglip_model
 
     def load_medgemma_text(self) -> tuple[AutoTokenizer, AutoModelForCausalLM]:
         if self.models.medgemma_model is not None and self.models.medgemma_tokenizer is not None:
             return self.models.medgemma_tokenizer, self.models.medgemma_model
 
-        device = self._resolve_device()
-        tokenizer = AutoTokenizer.from_pretrained(
-            config.MEDGEMMA_MODEL_ID,
-            local_files_only=config.OFFLINE_ONLY,
-        )
-        model = AutoModelForCausalLM.from_pretrained(
-            config.MEDGEMMA_MODEL_ID,
-            torch_dtype=torch.float16 if device == "cuda" else None,
-            local_files_only=config.OFFLINE_ONLY,
-        )
-        model.to(device)
-        model.eval()
-
-        self.models.medgemma_tokenizer = tokenizer
-        self.models.medgemma_model = model
-        return tokenizer, model
+        with self._medgemma_lock:
+            if self.models.medgemma_tokenizer is None:
+                with self._track_load("medgemma_text"):
+                    self._load_medgemma_model()
+                    tokenizer = AutoTokenizer.from_pretrained(
+                        config.MEDGEMMA_MODEL_ID,
+                        local_files_only=config.OFFLINE_ONLY,
+                    )
+                    # Batched generation pads; set once here rather than from the batcher thread.
+                    if tokenizer.pad_token_id is None:
+                        tokenizer.pad_token = tokenizer.eos_token
+                    self.models.medgemma_tokenizer = tokenizer
+            model = self._load_medgemma_model()
+            return self.models.medgemma_tokenizer, model
 
     def load_medgemma_multimodal(self) -> tuple[AutoProcessor, AutoModelForCausalLM]:
         if self.models.medgemma_model is not None and self.models.medgemma_processor is not None:
             return self.models.medgemma_processor, self.models.medgemma_model
 
-        device = self._resolve_device()
-        processor = AutoProcessor.from_pretrained(
-            config.MEDGEMMA_MODEL_ID,
-            local_files_only=config.OFFLINE_ONLY,
-        )
-        model = AutoModelForCausalLM.from_pretrained(
-            config.MEDGEMMA_MODEL_ID,
-            torch_dtype=torch.float16 if device == "cuda" else None,
-            local_files_only=config.OFFLINE_ONLY,
-        )
-        model.to(device)
-        model.eval()
-
-        self.models.medgemma_processor = processor
-        self.models.medgemma_model = model
-        return processor, model
+        with self._medgemma_lock:
+            if self.models.medgemma_processor is None:
+                with self._track_load("medgemma_multimodal"):
+                    self._load_medgemma_model()
+                    self.models.medgemma_processor = AutoProcessor.from_pretrained(
+                        config.MEDGEMMA_MODEL_ID,
+                        local_files_only=config.OFFLINE_ONLY,
+                    )
+            model = self._load_medgemma_model()
+            return self.models.medgemma_processor, model
+
+    def _load_medgemma_model(self) -> AutoModelForCausalLM:
+        # The text and multimodal front-ends share one copy of the weights.
+        with self._medgemma_lock:
+            if self.models.medgemma_model is None:
+                device = self._resolve_device()
+                model = AutoModelForCausalLM.from_pretrained(
+                    config.MEDGEMMA_MODEL_ID,
+                    torch_dtype=torch.float16 if device == "cuda" else None,
+                    local_files_only=config.OFFLINE_ONLY,
+                )
+                model.to(device)
+                model.eval()
+                self.models.medgemma_model = model
+            return self.models.medgemma_model
+
+    @contextmanager
+    def _track_load(self, name: str):
+        started = perf_counter()
+        self.mark(name, "loading")
+        try:
+            yield
+        except Exception as exc:
+            self.mark(name, "failed", error=str(exc))
+            MODEL_LOADS.inc(model=name, status="failed")
+            raise
+        elapsed = perf_counter() - started
+        self.mark(name, "loaded", load_ms=int(elapsed * 1000))
+        MODEL_LOADS.inc(model=name, status="loaded")
+        MODEL_LOAD_DURATION.set(elapsed, model=name)
+
+    def mark(self, name: str, state: str, **details) -> None:
+        with self._state_lock:
+            entry = self.load_state.setdefault(name, {})
+            entry["state"] = state
+            entry.update(details)
+
+    def status(self) -> dict[str, dict]:
+        with self._state_lock:
+            return {name: dict(entry) for name, entry in self.load_state.items()}
+
+    def memory_report(self) -> dict:
+        report: dict = {"models": {}}
+        resident = {
+            "medsiglip": self.models.medsiglip_model,
+            "medgemma": self.models.medgemma_model,
+        }
+        for name, model in resident.items():
+            if model is None:
+                report["models"][name] = {"loaded": False}
+                continue
+            tensors = list(model.parameters()) + list(model.buffers())
+            report["models"][name] = {
+                "loaded": True,
+                "parameters": sum(tensor.numel() for tensor in model.parameters()),
+                "bytes": sum(tensor.numel() * tensor.element_size() for tensor in tensors),
+                "device": str(next(model.parameters()).device),
+                "dtype": str(next(model.parameters()).dtype),
+            }
+        report["medgemma_front_ends"] = {
+            "tokenizer": self.models.medgemma_tokenizer is not None,
+            "processor": self.models.medgemma_processor is not None,
+        }
+        report["total_bytes"] = sum(item.get("bytes", 0) for item in report["models"].values())
+        if torch.cuda.is_available():
+            report["cuda"] = {
+                "allocated_bytes": torch.cuda.memory_allocated(),
+                "reserved_bytes": torch.cuda.memory_reserved(),
+            }
+        return report
@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from time import perf_counter
+from typing import Optional, Sequence
+
+from pdf2image import convert_from_bytes, pdfinfo_from_bytes
+from PIL import Image
+import pytesseract
+
+from app import config
+from app.services.metrics import OCR_PAGE_DURATION, OCR_PAGES
+
+
+def _ocr_page(image: Image.Image) -> tuple[str, int]:
+    """Worker entry point; must stay importable at module level for spawn."""
+    started = perf_counter()
+    text = pytesseract.image_to_string(image)
+    return text, int((perf_counter() - started) * 1000)
+
+
+@dataclass
+class PageTiming:
+    page: int
+    rasterize_ms: int
+    ocr_ms: int
+    raster_kb: int
+
+
+@dataclass
+class OCRDocument:
+    pages: list[str]
+    requested_pages: int
+    timings: list[PageTiming] = field(default_factory=list)
+
+    @property
+    def truncated(self) -> bool:
+        return len(self.pages) < self.requested_pages
+
+    def by_page(self) -> dict[int, str]:
+        return {timing.page: text for timing, text in zip(self.timings, self.pages)}
+
+
+class OCRWorkerPool:
+    """Rasterises PDFs one page at a time and OCRs the pages in worker processes.
+
+    Pages are submitted in order and collected in order. Raster bytes that are
+    in flight are capped by ``memory_budget_mb``: before another page is sent,
+    the oldest pages are collected until the new one fits. A single page larger
+    than the budget still goes through on its own. ``workers=0`` runs OCR
+    inline, which keeps the same page streaming without extra processes.
+    """
+
+    _instance: Optional["OCRWorkerPool"] = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, workers: int | None = None, memory_budget_mb: int | None = None) -> None:
+        self.workers = max(0, workers if workers is not None else config.OCR_WORKERS)
+        budget_mb = memory_budget_mb if memory_budget_mb is not None else config.OCR_MEMORY_BUDGET_MB
+        self.memory_budget_bytes = max(1, budget_mb) * 1024 * 1024
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def instance(cls) -> "OCRWorkerPool":
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
+
+    def ocr_pdf(
+        self,
+        file_bytes: bytes,
+        pages: Sequence[int] | None = None,
+        dpi: int | None = None,
+        max_pages: int | None = None,
+        grayscale: bool | None = None,
+    ) -> OCRDocument:
+        dpi = dpi or config.OCR_DPI
+        max_pages = max_pages if max_pages is not None else config.OCR_MAX_PAGES
+        grayscale = grayscale if grayscale is not None else config.OCR_GRAYSCALE
+
+        if pages is None:
+            pages = range(1, int(pdfinfo_from_bytes(file_bytes)["Pages"]) + 1)
+        pages = list(pages)
+        selected = pages[:max_pages] if max_pages > 0 else pages
+        document = OCRDocument(pages=[], requested_pages=len(pages))
+        in_flight: deque[tuple[int, int, int, Future]] = deque()
+        in_flight_bytes = 0
+
+        def collect_oldest() -> None:
+            nonlocal in_flight_bytes
+            page, rasterize_ms, size, future = in_flight.popleft()
+            text, ocr_ms = future.result()
+            in_flight_bytes -= size
+            document.pages.append(text)
+            document.timings.append(PageTiming(page, rasterize_ms, ocr_ms, size // 1024))
+            OCR_PAGES.inc(source="pdf")
+            OCR_PAGE_DURATION.observe(rasterize_ms / 1000, phase="rasterize")
+            OCR_PAGE_DURATION.observe(ocr_ms / 1000, phase="ocr")
+
+        try:
+            for page in selected:
+                started = perf_counter()
+                image = convert_from_bytes(
+                    file_bytes, dpi=dpi, first_page=page, last_page=page, grayscale=grayscale
+                )[0]
+                rasterize_ms = int((perf_counter() - started) * 1000)
+                size = image.width * image.height * len(image.getbands())
+
+                while in_flight and in_flight_bytes + size > self.memory_budget_bytes:
+                    collect_oldest()
+                in_flight.append((page, rasterize_ms, size, self._submit(image)))
+                in_flight_bytes += size
+                del image
+
+            while in_flight:
+                collect_oldest()
+        except BrokenProcessPool:
+            with self._lock:
+                self._executor = None
+            raise
+        finally:
+            for *_, future in in_flight:
+                future.cancel()
+        return document
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _submit(self, image: Image.Image) -> Future:
+        if self.workers == 0:
+            future: Future = Future()
+            future.set_result(_ocr_page(image))
+            return future
+        with self._lock:
+            if self._executor is None:
+                # Spawn rather than fork: the parent holds torch/model threads that must not be forked.
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            executor = self._executor
+        return executor.submit(_ocr_page, image)
@@ -1,16 +1,24 @@
 from __future__ import annotations
 
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from dataclasses import dataclass
 from time import perf_counter
-from typing import Optional
+from typing import Any, Callable, Optional
 
+import numpy as np
+
+from app import config
 from app.schemas import AgentTraceItem, CognitiveResult, LabInsights, LabParseResult, RetinalResult, RiskScores
 from app.services.cognitive import CognitiveAgent
 from app.services.lab_parser import LabParser
 from app.services.lab_value_agent import LabValueAgent
+from app.services.metrics import AGENT_DURATION, AGENT_RUNS
+from app.services.profiling import RequestProfiler
 from app.services.recommendations import RecommendationService
 from app.services.retinal import RetinalAnalyzer
+from app.services.retinal_image import load_fundus
 from app.services.risk import RiskScorer
+from app.services.tracing import record_detail, record_stage, span
 
 
 @dataclass
@@ -23,16 +31,38 @@ class OrchestratorOutput:
     recommendations: list
     agent_trace: list[AgentTraceItem]
     warnings: list[str]
+    # Set when a new retinal image was graded; indexed once the analysis has an id.
+    retinal_embedding: Optional[np.ndarray] = None
+
+
+StageCallback = Callable[[str, Any, AgentTraceItem], None]
+
+
+@dataclass
+class Stage:
+    key: str
+    agent: str
+    fn: Callable[[dict[str, Any]], Any]
+    depends_on: tuple[str, ...] = ()
+    skip_reason: Optional[str] = None
 
 
 class OrchestratorAgent:
-    def __init__(self) -> None:
-        self.intake_agent = LabParser()
+    def __init__(
+        self,
+        intake_agent: Optional[LabParser] = None,
+        retinal_agent: Optional[RetinalAnalyzer] = None,
+    ) -> None:
+        self.intake_agent = intake_agent or LabParser()
         self.lab_value_agent = LabValueAgent()
-        self.retinal_agent = RetinalAnalyzer()
+        self.retinal_agent = retinal_agent or RetinalAnalyzer()
         self.cognitive_agent = CognitiveAgent()
         self.risk_agent = RiskScorer()
         self.recommendation_agent = RecommendationService()
+        self._stage_executor = ThreadPoolExecutor(
+            max_workers=max(1, config.ORCHESTRATOR_STAGE_WORKERS),
+            thread_name_prefix="orchestrator-stage",
+        )
 
     def run(
         self,
@@ -40,52 +70,35 @@ class OrchestratorAgent:
         lab_bytes: bytes,
         retinal_bytes: Optional[bytes],
         cognitive_notes: Optional[str],
+        on_stage: Optional[StageCallback] = None,
+        profiler: Optional[RequestProfiler] = None,
     ) -> OrchestratorOutput:
+        """Run the agent pipeline.
+
+        ``on_stage`` is called from the scheduling thread with the stage key, its
+        result and its trace item as soon as each stage finishes or is skipped.
+        With a ``profiler``, every stage is profiled and the profile is written
+        once the pipeline ends, whether or not it succeeded.
+        """
         warnings: list[str] = []
         trace: list[AgentTraceItem] = []
+        retinal_embeddings: list[np.ndarray] = []
 
-        labs = self._run_with_trace(
-            trace,
-            "Intake Agent",
-            lambda: self.intake_agent.parse(lab_filename, lab_bytes),
-        )
-        lab_insights = self._run_with_trace(
-            trace,
-            "Lab Value Agent",
-            lambda: self.lab_value_agent.interpret(labs.values),
+        stages = self._stages(
+            lab_filename, lab_bytes, retinal_bytes, cognitive_notes, warnings, retinal_embeddings
         )
-        retinal = None
-        if retinal_bytes:
-            retinal = self._run_with_trace(
-                trace,
-                "Retinal Agent",
-                lambda: self._analyze_retinal(retinal_bytes, warnings),
-            )
-        else:
-            trace.append(
-                AgentTraceItem(
-                    agent="Retinal Agent",
-                    status="skipped",
-                    duration_ms=0,
-                    notes="No retinal image provided.",
-                )
-            )
+        try:
+            results = self._execute(stages, trace, on_stage, profiler)
+        finally:
+            if profiler is not None:
+                profiler.write(trace)
 
-        cognitive = self._run_with_trace(
-            trace,
-            "Cognitive Agent",
-            lambda: self.cognitive_agent.score(cognitive_notes),
-        )
-        risk_scores = self._run_with_trace(
-            trace,
-            "Risk Scoring Agent",
-            lambda: self.risk_agent.score(labs.values, retinal, cognitive),
-        )
-        recommendations = self._run_with_trace(
-            trace,
-            "Recommendation Agent",
-            lambda: self.recommendation_agent.generate(risk_scores),
-        )
+        labs = results["intake"]
+        lab_insights = results["lab_value"]
+        retinal = results["retinal"]
+        cognitive = results["cognitive"]
+        risk_scores = results["risk"]
+        recommendations = results["recommendation"]
 
         return OrchestratorOutput(
             labs=labs,
@@ -96,15 +109,144 @@ class OrchestratorAgent:
             recommendations=recommendations,
             agent_trace=trace,
             warnings=warnings,
+            retinal_embedding=retinal_embeddings[0] if retinal_embeddings else None,
         )
 
-    def _analyze_retinal(self, file_bytes: bytes, warnings: list[str]) -> RetinalResult:
-        from PIL import Image
-        import io
+    def shutdown(self) -> None:
+        self._stage_executor.shutdown(wait=True)
 
+    def _stages(
+        self,
+        lab_filename: str,
+        lab_bytes: bytes,
+        retinal_bytes: Optional[bytes],
+        cognitive_notes: Optional[str],
+        warnings: list[str],
+        retinal_embeddings: list[np.ndarray],
+    ) -> list[Stage]:
+        # Declaration order is also the order stages appear in agent_trace.
+        return [
+            Stage(
+                key="intake",
+                agent="Intake Agent",
+                fn=lambda _: self.intake_agent.parse(lab_filename, lab_bytes),
+            ),
+            Stage(
+                key="lab_value",
+                agent="Lab Value Agent",
+                fn=lambda done: self.lab_value_agent.interpret(done["intake"].values),
+                depends_on=("intake",),
+            ),
+            Stage(
+                key="retinal",
+                agent="Retinal Agent",
+                fn=lambda _: self._analyze_retinal(retinal_bytes, warnings, retinal_embeddings),
+                skip_reason=None if retinal_bytes else "No retinal image provided.",
+            ),
+            Stage(
+                key="cognitive",
+                agent="Cognitive Agent",
+                fn=lambda _: self.cognitive_agent.score(cognitive_notes),
+            ),
+            Stage(
+                key="risk",
+                agent="Risk Scoring Agent",
+                fn=lambda done: self.risk_agent.score(done["intake"].values, done["retinal"], done["cognitive"]),
+                depends_on=("intake", "retinal", "cognitive"),
+            ),
+            Stage(
+                key="recommendation",
+                agent="Recommendation Agent",
+                fn=lambda done: self.recommendation_agent.generate(done["risk"]),
+                depends_on=("risk",),
+            ),
+        ]
+
+    def _execute(
+        self,
+        stages: list[Stage],
+        trace: list[AgentTraceItem],
+        on_stage: Optional[StageCallback] = None,
+        profiler: Optional[RequestProfiler] = None,
+    ) -> dict[str, Any]:
+        """Run stages as soon as their dependencies finish, independent ones concurrently."""
+        origin = perf_counter()
+        order = {stage.agent: index for index, stage in enumerate(stages)}
+        pending = {stage.key: stage for stage in stages}
+        running: dict[Future, Stage] = {}
+        results: dict[str, Any] = {}
+        error: Optional[BaseException] = None
+
+        while pending or running:
+            scheduled = True
+            while error is None and scheduled:
+                scheduled = False
+                ready = [stage for stage in pending.values() if all(dep in results for dep in stage.depends_on)]
+                for stage in ready:
+                    del pending[stage.key]
+                    if stage.skip_reason is not None:
+                        results[stage.key] = None
+                        AGENT_RUNS.inc(agent=stage.agent, status="skipped")
+                        item = AgentTraceItem(
+                            agent=stage.agent,
+                            status="skipped",
+                            start_offset_ms=int((perf_counter() - origin) * 1000),
+                            duration_ms=0,
+                            notes=stage.skip_reason,
+                        )
+                        trace.append(item)
+                        if on_stage is not None:
+                            on_stage(stage.key, None, item)
+                        scheduled = True
+                        continue
+                    future = self._stage_executor.submit(
+                        self._run_with_trace,
+                        trace,
+                        stage.agent,
+                        lambda stage=stage: stage.fn(results),
+                        origin,
+                        profiler,
+                    )
+                    running[future] = stage
+
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                try:
+                    results[stage.key] = future.result()
+                except Exception as exc:
+                    error = error or exc
+                    continue
+                if on_stage is not None:
+                    item = next(item for item in trace if item.agent == stage.agent)
+                    on_stage(stage.key, results[stage.key], item)
+
+        trace.sort(key=lambda item: order[item.agent])
+        if error is not None:
+            raise error
+        if pending:
+            raise RuntimeError(f"Unresolvable stage dependencies: {sorted(pending)}")
+        return results
+
+    def _analyze_retinal(
+        self,
+        file_bytes: bytes,
+        warnings: list[str],
+        embeddings: list[np.ndarray],
+    ) -> RetinalResult:
         try:
-            image = Image.open(io.BytesIO(file_bytes)).convert("RGB")
-            return self.retinal_agent.analyze(image)
+            started = perf_counter()
+            decode: dict[str, Any] = {}
+            with span("decode"):
+                image = load_fundus(file_bytes, details=decode)
+            decode.update(input_size=list(image.size), ms=int((perf_counter() - started) * 1000))
+            record_detail("decode", decode)
+            result, embedding = self.retinal_agent.analyze_with_embedding(image)
+            if embedding is not None:
+                embeddings.append(embedding)
+            return result
         except Exception as exc:  # pragma: no cover - safety net for demo
             warnings.append(f"Retinal analysis failed: {exc}")
             return RetinalResult(
@@ -114,19 +256,49 @@ class OrchestratorAgent:
                 model_metadata={"error": str(exc)},
             )
 
-    def _run_with_trace(self, trace: list[AgentTraceItem], agent: str, fn):
+    def _run_with_trace(
+        self,
+        trace: list[AgentTraceItem],
+        agent: str,
+        fn,
+        origin: Optional[float] = None,
+        profiler: Optional[RequestProfiler] = None,
+    ):
+        if profiler is not None:
+            # Profiled stages run one at a time; time them from when they hold the profiler.
+            with profiler.stage(agent):
+                return self._run_with_trace(trace, agent, fn, origin)
         started = perf_counter()
+        start_offset_ms = int((started - origin) * 1000) if origin is not None else 0
         try:
-            result = fn()
-            duration_ms = int((perf_counter() - started) * 1000)
-            trace.append(AgentTraceItem(agent=agent, status="ok", duration_ms=duration_ms))
+            with record_stage() as recorder:
+                result = fn()
+            elapsed = perf_counter() - started
+            AGENT_DURATION.observe(elapsed, agent=agent)
+            AGENT_RUNS.inc(agent=agent, status="ok")
+            duration_ms = int(elapsed * 1000)
+            trace.append(
+                AgentTraceItem(
+                    agent=agent,
+                    status="ok",
+                    start_offset_ms=start_offset_ms,
+                    duration_ms=duration_ms,
+                    cache_hit=recorder.cache_hit,
+                    details=recorder.details or None,
+                    spans=recorder.spans or None,
+                )
+            )
             return result
         except Exception as exc:  # pragma: no cover - safety net for demo
-            duration_ms = int((perf_counter() - started) * 1000)
+            elapsed = perf_counter() - started
+            AGENT_DURATION.observe(elapsed, agent=agent)
+            AGENT_RUNS.inc(agent=agent, status="error")
+            duration_ms = int(elapsed * 1000)
             trace.append(
                 AgentTraceItem(
                     agent=agent,
                     status="error",
+                    start_offset_ms=start_offset_ms,
                     duration_ms=duration_ms,
                     notes=str(exc),
                 )
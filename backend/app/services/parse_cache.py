@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+
+from app import config
+from app.schemas import LabParseResult
+from app.storage import SQLiteStore
+
+
+class ParseResultCache:
+    """Lab parse results keyed by a hash of the upload plus the parse settings.
+
+    The in-memory tier is an LRU bounded by entry count and by the size of the
+    serialized results. With a store, results are also kept in the
+    ``lab_parse_cache`` table, which evicts its least recently used rows past
+    ``PARSE_CACHE_DB_MAX_ENTRIES``. The parser version is part of the key, so
+    entries written by an older parser are never served and age out.
+    """
+
+    def __init__(
+        self,
+        store: Optional[SQLiteStore] = None,
+        max_entries: int | None = None,
+        max_mb: int | None = None,
+        db_max_entries: int | None = None,
+    ) -> None:
+        self.store = store
+        self.max_entries = max(1, max_entries or config.PARSE_CACHE_MAX_ENTRIES)
+        self.max_bytes = max(1, max_mb or config.PARSE_CACHE_MAX_MB) * 1024 * 1024
+        self.db_max_entries = max(1, db_max_entries or config.PARSE_CACHE_DB_MAX_ENTRIES)
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "persistent_hits": 0, "misses": 0, "evictions": 0}
+
+    @staticmethod
+    def key(file_bytes: bytes, params: dict[str, Any]) -> str:
+        digest = hashlib.sha256(file_bytes).hexdigest()
+        payload = json.dumps({"sha256": digest, "params": params}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[LabParseResult]:
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is not None:
+                self._entries.move_to_end(key)
+                self._counters["hits"] += 1
+                return LabParseResult.model_validate_json(payload)
+
+        payload = self.store.fetch_parse_result(key) if self.store is not None else None
+        with self._lock:
+            if payload is None:
+                self._counters["misses"] += 1
+                return None
+            self._remember(key, payload)
+            self._counters["hits"] += 1
+            self._counters["persistent_hits"] += 1
+        return LabParseResult.model_validate_json(payload)
+
+    def put(self, key: str, result: LabParseResult) -> None:
+        payload = result.model_dump_json()
+        with self._lock:
+            self._remember(key, payload)
+        if self.store is not None:
+            self.store.save_parse_result(key, payload, self.db_max_entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return {
+                **self._counters,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hit_rate": round(self._counters["hits"] / lookups, 4) if lookups else 0.0,
+                "persistent": self.store is not None,
+            }
+
+    def _remember(self, key: str, payload: str) -> None:
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= len(previous)
+        self._entries[key] = payload
+        self._bytes += len(payload)
+        while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+            self._counters["evictions"] += 1
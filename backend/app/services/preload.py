@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import threading
+from time import perf_counter
+from typing import Callable
+
+import torch
+from PIL import Image
+
+from app import config
+from app.services.model_registry import ModelRegistry
+
+
+class ModelPreloader:
+    """Loads and warms the enabled models in the background at startup."""
+
+    def __init__(self) -> None:
+        self.registry = ModelRegistry.instance()
+        self._thread: threading.Thread | None = None
+
+    def required(self) -> list[str]:
+        names: list[str] = []
+        if config.ENABLE_TEXT_LLM:
+            names.append("medgemma_text")
+        if config.ENABLE_RETINAL:
+            names.extend(["medsiglip", "medgemma_multimodal"])
+        return names
+
+    def start(self) -> None:
+        if not config.PRELOAD_MODELS or self._thread is not None:
+            return
+        for name in self.required():
+            self.registry.mark(name, "pending")
+        self._thread = threading.Thread(target=self.run, name="model-preload", daemon=True)
+        self._thread.start()
+
+    def run(self) -> None:
+        steps: dict[str, tuple[Callable[[], object], Callable[[], None]]] = {
+            "medgemma_text": (self.registry.load_medgemma_text, self._warm_text),
+            "medsiglip": (self.registry.load_medsiglip, self._warm_medsiglip),
+            "medgemma_multimodal": (self.registry.load_medgemma_multimodal, self._warm_multimodal),
+        }
+        for name in self.required():
+            load, warm = steps[name]
+            try:
+                load()
+                if config.WARMUP_MODELS:
+                    self.registry.mark(name, "warming")
+                    started = perf_counter()
+                    warm()
+                    self.registry.mark(name, "warm", warmup_ms=int((perf_counter() - started) * 1000))
+                else:
+                    self.registry.mark(name, "loaded")
+            except Exception as exc:  # pragma: no cover - reported through readiness
+                self.registry.mark(name, "failed", error=str(exc))
+
+    def readiness(self) -> tuple[bool, dict]:
+        status = self.registry.status()
+        if not config.PRELOAD_MODELS:
+            return True, {"ready": True, "preload": False, "models": status}
+        wanted = "warm" if config.WARMUP_MODELS else "loaded"
+        ready = all(status.get(name, {}).get("state") == wanted for name in self.required())
+        return ready, {"ready": ready, "preload": True, "models": status}
+
+    def _warm_text(self) -> None:
+        tokenizer, model = self.registry.load_medgemma_text()
+        device = next(model.parameters()).device
+        inputs = tokenizer("Summary:", return_tensors="pt").to(device)
+        with torch.no_grad():
+            model.generate(**inputs, max_new_tokens=1, do_sample=False)
+
+    def _warm_medsiglip(self) -> None:
+        processor, model = self.registry.load_medsiglip()
+        device = next(model.parameters()).device
+        inputs = processor(images=Image.new("RGB", (64, 64)), return_tensors="pt")
+        with torch.no_grad():
+            model.get_image_features(pixel_values=inputs["pixel_values"].to(device))
+
+    def _warm_multimodal(self) -> None:
+        from app.services.retinal import RetinalAnalyzer
+
+        processor, model = self.registry.load_medgemma_multimodal()
+        device = next(model.parameters()).device
+        prompt = RetinalAnalyzer()._build_prompt(processor)
+        inputs = processor(text=prompt, images=Image.new("RGB", (64, 64)), return_tensors="pt")
+        inputs = {key: value.to(device) for key, value in inputs.items()}
+        with torch.no_grad():
+            model.generate(**inputs, max_new_tokens=1, do_sample=False)
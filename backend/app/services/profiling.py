@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import cProfile
+import hmac
+import json
+import pstats
+import re
+import threading
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Iterator, Optional, Sequence
+from uuid import uuid4
+
+from app import config
+from app.schemas import AgentTraceItem
+
+# cProfile (from 3.12) and the torch profiler allow one active profiler per process.
+_ACTIVE = threading.Lock()
+_TOP_FUNCTIONS = 25
+
+
+class RequestProfiler:
+    """Profiles the stages of one analysis and writes the result under ``PROFILE_DIR``.
+
+    Each stage runs under its own cProfile (and, with ``torch_trace``, a torch
+    profiler exporting a Chrome trace). Profiled stages take a process-wide
+    lock, so they run one at a time and their timings show the work of the
+    stage rather than contention with its siblings. Work on other threads or
+    processes, such as the LLM batcher and the OCR workers, shows up only as
+    the time spent waiting for it.
+    """
+
+    def __init__(self, directory: str | None = None, torch_trace: bool | None = None) -> None:
+        self.id = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{uuid4().hex[:8]}"
+        self.directory = Path(directory or config.PROFILE_DIR)
+        self.torch_trace = config.PROFILE_TORCH if torch_trace is None else torch_trace
+        self._profiles: list[tuple[str, cProfile.Profile]] = []
+        self._files: list[str] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, agent: str) -> Iterator[None]:
+        with _ACTIVE:
+            profile = cProfile.Profile()
+            with self._torch_profiler(agent):
+                profile.enable()
+                try:
+                    yield
+                finally:
+                    profile.disable()
+            with self._lock:
+                self._profiles.append((agent, profile))
+
+    def write(self, trace: Sequence[AgentTraceItem]) -> dict[str, Any]:
+        """Write ``<id>.prof`` (all stages, for snakeviz or ``pstats``) and an ``<id>.json`` summary."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            profiles = list(self._profiles)
+            files = list(self._files)
+        summary: dict[str, Any] = {
+            "id": self.id,
+            "trace": [item.model_dump(mode="json") for item in trace],
+            "agents": {agent: _top_functions(pstats.Stats(profile)) for agent, profile in profiles},
+        }
+        if profiles:
+            merged = pstats.Stats(profiles[0][1])
+            for _, profile in profiles[1:]:
+                merged.add(profile)
+            merged.dump_stats(self.directory / f"{self.id}.prof")
+            files.insert(0, f"{self.id}.prof")
+        summary["files"] = files
+        (self.directory / f"{self.id}.json").write_text(json.dumps(summary, indent=2), encoding="utf-8")
+        return summary
+
+    def _torch_profiler(self, agent: str):
+        if not self.torch_trace:
+            return nullcontext()
+        return _torch_trace(self.directory / f"{self.id}-{_slug(agent)}.trace.json", self._files, self._lock)
+
+
+@contextmanager
+def _torch_trace(path: Path, files: list[str], lock: threading.Lock) -> Iterator[None]:
+    import torch
+    from torch.profiler import ProfilerActivity, profile
+
+    activities = [ProfilerActivity.CPU]
+    if torch.cuda.is_available():
+        activities.append(ProfilerActivity.CUDA)
+    with profile(activities=activities, record_shapes=True) as profiler:
+        yield
+    path.parent.mkdir(parents=True, exist_ok=True)
+    profiler.export_chrome_trace(str(path))
+    with lock:
+        files.append(path.name)
+
+
+def _top_functions(stats: pstats.Stats, limit: int = _TOP_FUNCTIONS) -> list[dict[str, Any]]:
+    # By self time: cumulative time ranks the orchestration wrappers around every stage first.
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:limit]
+    return [
+        {
+            "function": f"{Path(filename).name}:{line}({name})" if line else name,
+            "calls": calls,
+            "self_ms": round(self_time * 1000, 2),
+            "cumulative_ms": round(cumulative * 1000, 2),
+        }
+        for (filename, line, name), (_, calls, self_time, cumulative, _) in rows
+    ]
+
+
+def _slug(agent: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", agent.lower()).strip("-")
+
+
+def authorize(flag: Optional[str]) -> bool:
+    """Whether a request asked for profiling; raises ``PermissionError`` if it may not have it."""
+    if not flag or flag.lower() in {"0", "false", "no"}:
+        return False
+    if not config.PROFILING_ENABLED:
+        raise PermissionError("Profiling is disabled on this server.")
+    if config.PROFILE_TOKEN and not hmac.compare_digest(flag.encode(), config.PROFILE_TOKEN.encode()):
+        raise PermissionError("Invalid profiling token.")
+    return True
@@ -4,10 +4,17 @@ from typing import List
 
 from app import config
 from app.schemas import Recommendation, RiskScores
-from app.services.llm import TextLLM
+from app.services.llm import StopRule, TextLLM
 
 
 class RecommendationService:
+    PROMPT_PREFIX = (
+        "You are a clinical risk assistant. Generate 3 concise, actionable "
+        "recommendations for a patient with diabetes based on these risk scores:\n"
+    )
+    # Done after three complete "Title | Expected impact | Rationale" lines.
+    STOP = StopRule(r"^[^|\n]*\|[^|\n]*\|[^\n]*\n", count=3)
+
     def __init__(self) -> None:
         self.llm = TextLLM()
 
@@ -16,15 +23,14 @@ class RecommendationService:
             return self._fallback()
 
         prompt = self._prompt(risk_scores)
-        lines = self.llm.generate_lines(prompt, max_new_tokens=256)
+        lines = self.llm.generate_lines(prompt, max_new_tokens=256, prefix=self.PROMPT_PREFIX, stop=self.STOP)
         recommendations = self._parse(lines)
         return recommendations if recommendations else self._fallback()
 
     def _prompt(self, risk_scores: RiskScores) -> str:
         return (
-            "You are a clinical risk assistant. Generate 3 concise, actionable "
-            "recommendations for a patient with diabetes based on these risk scores:\n"
-            f"- Dementia: {risk_scores.dementia.score:.1f} ({risk_scores.dementia.level})\n"
+            self.PROMPT_PREFIX
+            + f"- Dementia: {risk_scores.dementia.score:.1f} ({risk_scores.dementia.level})\n"
             f"- Cardiovascular: {risk_scores.cardiovascular.score:.1f} ({risk_scores.cardiovascular.level})\n"
             f"- Retinopathy: {risk_scores.retinopathy.score:.1f} ({risk_scores.retinopathy.level})\n"
             f"- Nephropathy: {risk_scores.nephropathy.score:.1f} ({risk_scores.nephropathy.level})\n"
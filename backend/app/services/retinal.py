@@ -3,72 +3,139 @@ from __future__ import annotations
 import re
 from typing import List, Optional
 
+import numpy as np
+import torch
 from PIL import Image
 
 from app import config
 from app.schemas import RetinalResult
+from app.services import tracing
+from app.services.llm import StopRule, stopping_criteria
 from app.services.model_registry import ModelRegistry
+from app.services.retinal_index import RetinalEmbeddingIndex
+from app.storage import SQLiteStore
 
 
 class RetinalAnalyzer:
-    def __init__(self) -> None:
+    # Done once "Grade: ... | Confidence: ... | Summary: <text>." has been written.
+    STOP = StopRule(r"summary[ \t]*[:\-]?[ \t]*\S[^\n]*?(?:[.!?](?=\s)|\n)")
+
+    # Stored results with these grades carry no grading worth reusing.
+    UNGRADED = ("Unknown", "Not Analyzed")
+
+    def __init__(
+        self,
+        index: Optional[RetinalEmbeddingIndex] = None,
+        store: Optional[SQLiteStore] = None,
+    ) -> None:
         self.registry = ModelRegistry.instance()
+        self.index = index
+        self.store = store
 
     def analyze(self, image: Image.Image) -> RetinalResult:
+        return self.analyze_with_embedding(image)[0]
+
+    def analyze_with_embedding(self, image: Image.Image) -> tuple[RetinalResult, Optional[np.ndarray]]:
+        """Grade ``image`` and return the MedSigLIP embedding to index once the analysis is stored.
+
+        No embedding is returned when the grade was reused from a near-duplicate,
+        since that image is already in the index, or when grading failed.
+        """
         if not config.ENABLE_RETINAL:
             return RetinalResult(
                 grade="Not Analyzed",
                 findings=[],
                 summary="Retinal analysis disabled.",
                 model_metadata={"enabled": False},
-            )
+            ), None
 
-        embedding_summary = self._medsiglip_embedding_summary(image)
-        grade, confidence, findings, narrative = self._medgemma_grade(image)
+        with tracing.span("medsiglip"):
+            embedding, embedding_summary = self._medsiglip_embedding(image)
+        with tracing.span("index_lookup"):
+            reused = self._reuse_grade(embedding)
+        if reused is not None:
+            return reused, None
+
+        with tracing.span("medgemma"):
+            grade, confidence, findings, narrative = self._medgemma_grade(image)
 
         summary = narrative or embedding_summary
         model_metadata = {
             "medsiglip": config.MEDSIGLIP_MODEL_ID,
             "medgemma": config.MEDGEMMA_MODEL_ID,
         }
+        # An ungraded entry is never reused but would still be the nearest neighbour of its near-duplicates.
         return RetinalResult(
             grade=grade,
             confidence=confidence,
             findings=findings,
             summary=summary,
             model_metadata=model_metadata,
-        )
+        ), None if grade in self.UNGRADED else embedding
 
-    def _medsiglip_embedding_summary(self, image: Image.Image) -> str:
+    def _medsiglip_embedding(self, image: Image.Image) -> tuple[Optional[np.ndarray], str]:
         try:
-            processor, model = self.registry.load_medsiglip()
-            inputs = processor(images=image, return_tensors="pt")
-            device = next(model.parameters()).device
-            inputs = {key: value.to(device) for key, value in inputs.items()}
-            outputs = model(**inputs)
-            embedding = getattr(outputs, "pooler_output", None)
-            if embedding is None:
-                return "Unable to derive embedding from MedSigLIP output."
-            return "Retinal embedding generated locally."
+            with tracing.span("load_model"):
+                processor, model = self.registry.load_medsiglip()
+            with tracing.span("preprocess"):
+                inputs = processor(images=image, return_tensors="pt")
+                device = next(model.parameters()).device
+                pixel_values = inputs["pixel_values"].to(device)
+            with torch.no_grad(), tracing.span("forward"):
+                if hasattr(model, "get_image_features"):
+                    features = model.get_image_features(pixel_values=pixel_values)
+                else:
+                    features = getattr(model(pixel_values=pixel_values), "pooler_output", None)
+            if features is None:
+                return None, "Unable to derive embedding from MedSigLIP output."
+            return features[0].float().cpu().numpy(), "Retinal embedding generated locally."
         except Exception as exc:  # pragma: no cover - demo safety
-            return f"MedSigLIP embedding failed: {exc}"
+            return None, f"MedSigLIP embedding failed: {exc}"
+
+    def _reuse_grade(self, embedding: Optional[np.ndarray]) -> Optional[RetinalResult]:
+        if embedding is None or self.index is None or self.store is None or config.RETINAL_REUSE_DISTANCE <= 0:
+            return None
+        match = self.index.nearest(embedding)
+        stored = None
+        if match is not None and match[1] <= config.RETINAL_REUSE_DISTANCE:
+            analysis = self.store.fetch_by_id(match[0], fields=("retinal",))
+            stored = analysis["retinal"] if analysis else None
+        if not stored or stored.get("grade") in self.UNGRADED:
+            tracing.record_cache(False)
+            return None
+
+        tracing.record_cache(True)
+        analysis_id, distance = match
+        result = RetinalResult.model_validate(stored)
+        result.model_metadata = {
+            **result.model_metadata,
+            "reused_from_analysis": analysis_id,
+            "embedding_distance": round(distance, 5),
+        }
+        return result
 
     def _medgemma_grade(
         self, image: Image.Image
     ) -> tuple[str, Optional[float], List[str], Optional[str]]:
         try:
-            processor, model = self.registry.load_medgemma_multimodal()
+            with tracing.span("load_model"):
+                processor, model = self.registry.load_medgemma_multimodal()
             device = next(model.parameters()).device
-            prompt = self._build_prompt(processor)
-            inputs = processor(text=prompt, images=image, return_tensors="pt")
-            inputs = {key: value.to(device) for key, value in inputs.items()}
-            output_ids = model.generate(
-                **inputs,
-                max_new_tokens=256,
-                do_sample=False,
-                temperature=0.0,
-            )
-            decoded = processor.tokenizer.decode(output_ids[0], skip_special_tokens=True)
+            with tracing.span("preprocess"):
+                prompt = self._build_prompt(processor)
+                inputs = processor(text=prompt, images=image, return_tensors="pt")
+                inputs = {key: value.to(device) for key, value in inputs.items()}
+            prompt_length = inputs["input_ids"].shape[1]
+            with tracing.span("generate"):
+                output_ids = model.generate(
+                    **inputs,
+                    max_new_tokens=256,
+                    do_sample=False,
+                    temperature=0.0,
+                    stopping_criteria=stopping_criteria(processor.tokenizer, prompt_length, [self.STOP]),
+                )
+            with tracing.span("decode"):
+                decoded = processor.tokenizer.decode(output_ids[0, prompt_length:], skip_special_tokens=True)
             return self._parse_response(decoded)
         except Exception as exc:  # pragma: no cover - demo safety
             return "Unknown", None, [], f"MedGemma grading failed: {exc}"
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import io
+from typing import Any
+
+import numpy as np
+from PIL import Image
+
+from app import config
+
+# Pixels darker than this (0-255 luma) count as the black surround of a fundus photo.
+DISC_THRESHOLD = 20
+# Below this share of the frame, the "disc" is more likely noise than a retina; keep the full frame.
+MIN_DISC_FRACTION = 0.2
+
+
+def load_fundus(file_bytes: bytes, size: int | None = None, details: dict[str, Any] | None = None) -> Image.Image:
+    """Decode a fundus photo straight to a ``size`` x ``size`` RGB image centred on the retinal disc.
+
+    JPEGs are decoded at the smallest DCT scale (1/2, 1/4 or 1/8) that still
+    covers ``size``, so a 24 MP upload never exists at full resolution. The
+    result is resized once; both vision processors receive it already at (or
+    near) their input size.
+    """
+    size = size or config.RETINAL_INPUT_SIZE
+    image = Image.open(io.BytesIO(file_bytes))
+    source_size = image.size
+    if image.format == "JPEG":
+        image.draft("RGB", (size, size))
+    image = image.convert("RGB")
+    decoded_size = image.size
+
+    if config.RETINAL_CROP:
+        image = image.crop(_disc_box(image))
+    if image.size != (size, size):
+        image = image.resize((size, size), Image.Resampling.BILINEAR, reducing_gap=2.0)
+
+    if details is not None:
+        details.update(source_size=list(source_size), decoded_size=list(decoded_size))
+    return image
+
+
+def _disc_box(image: Image.Image) -> tuple[int, int, int, int]:
+    """Square box around the bright disc; corners past the frame are filled black by ``crop``."""
+    width, height = image.size
+    scale = max(1, max(width, height) // 256)
+    mask = np.asarray(image.convert("L").reduce(scale)) > DISC_THRESHOLD
+    rows = np.flatnonzero(mask.any(axis=1))
+    cols = np.flatnonzero(mask.any(axis=0))
+    if len(rows) == 0 or (rows[-1] - rows[0] + 1) * (cols[-1] - cols[0] + 1) < MIN_DISC_FRACTION * mask.size:
+        rows, cols = np.array([0, mask.shape[0] - 1]), np.array([0, mask.shape[1] - 1])
+
+    top, bottom = int(rows[0]) * scale, min(height, (int(rows[-1]) + 1) * scale)
+    left, right = int(cols[0]) * scale, min(width, (int(cols[-1]) + 1) * scale)
+    side = max(bottom - top, right - left)
+    x0 = (left + right - side) // 2
+    y0 = (top + bottom - side) // 2
+    return x0, y0, x0 + side, y0 + side
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import json
+import threading
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from app import config
+
+
+class RetinalEmbeddingIndex:
+    """Exact cosine nearest-neighbour search over stored MedSigLIP embeddings.
+
+    Embeddings are L2-normalised and appended as float16 rows to
+    ``vectors.f16``, with the owning analysis id in ``ids.i64``. Both files are
+    memory-mapped on first use and searched in blocks, so the whole index never
+    has to be resident as float32. The files are tied to the model that
+    produced them; a different ``MEDSIGLIP_MODEL_ID`` starts a fresh index.
+    """
+
+    BLOCK_ROWS = 65536
+
+    def __init__(self, directory: str | None = None, model_id: str | None = None) -> None:
+        self.directory = Path(directory or config.RETINAL_INDEX_DIR)
+        self.model_id = model_id or config.MEDSIGLIP_MODEL_ID
+        self._vectors_path = self.directory / "vectors.f16"
+        self._ids_path = self.directory / "ids.i64"
+        self._meta_path = self.directory / "index.json"
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._dim: Optional[int] = None
+        self._vectors: Optional[np.memmap] = None
+        self._ids: Optional[np.memmap] = None
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._load()
+            return 0 if self._ids is None else len(self._ids)
+
+    def nearest(self, embedding: np.ndarray) -> Optional[tuple[int, float]]:
+        """Return ``(analysis_id, cosine_distance)`` of the closest stored embedding."""
+        query = self._normalise(embedding)
+        with self._lock:
+            self._load()
+            if self._vectors is None or self._ids is None or len(self._ids) == 0 or self._dim != len(query):
+                return None
+            vectors, ids = self._vectors, self._ids
+
+        best_row, best_similarity = -1, -np.inf
+        for start in range(0, len(ids), self.BLOCK_ROWS):
+            block = np.asarray(vectors[start : start + self.BLOCK_ROWS], dtype=np.float32)
+            similarities = block @ query
+            row = int(np.argmax(similarities))
+            if similarities[row] > best_similarity:
+                best_row, best_similarity = start + row, float(similarities[row])
+        return int(ids[best_row]), 1.0 - best_similarity
+
+    def add(self, analysis_id: int, embedding: np.ndarray) -> None:
+        vector = self._normalise(embedding)
+        with self._lock:
+            self._load()
+            if self._dim is None:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                self._meta_path.write_text(json.dumps({"model": self.model_id, "dim": len(vector)}))
+                self._dim = len(vector)
+            if len(vector) != self._dim:
+                raise ValueError(f"Embedding has {len(vector)} dimensions, index expects {self._dim}.")
+            self._align()
+            with self._vectors_path.open("ab") as handle:
+                handle.write(vector.astype(np.float16).tobytes())
+            with self._ids_path.open("ab") as handle:
+                handle.write(np.array([analysis_id], dtype=np.int64).tobytes())
+            self._map()
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._load()
+            return {
+                "entries": 0 if self._ids is None else len(self._ids),
+                "dim": self._dim,
+                "bytes": 0 if self._vectors is None else self._vectors.nbytes,
+            }
+
+    def _load(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self._meta_path.exists():
+            return
+        meta = json.loads(self._meta_path.read_text())
+        if meta.get("model") != self.model_id:
+            for path in (self._vectors_path, self._ids_path, self._meta_path):
+                path.unlink(missing_ok=True)
+            return
+        self._dim = int(meta["dim"])
+        self._align()
+        self._map()
+
+    def _rows(self) -> int:
+        sizes = [path.stat().st_size if path.exists() else 0 for path in (self._vectors_path, self._ids_path)]
+        return min(sizes[0] // (2 * self._dim), sizes[1] // 8)
+
+    def _align(self) -> None:
+        # An interrupted append can leave one file a row ahead of the other. Cut both back to
+        # the whole pairs before appending, or every later vector would sit beside the wrong id.
+        rows = self._rows()
+        for path, row_bytes in ((self._vectors_path, 2 * self._dim), (self._ids_path, 8)):
+            if path.exists() and path.stat().st_size != rows * row_bytes:
+                with path.open("r+b") as handle:
+                    handle.truncate(rows * row_bytes)
+
+    def _map(self) -> None:
+        if self._dim is None or not self._vectors_path.exists() or not self._ids_path.exists():
+            return
+        rows = self._rows()
+        if rows == 0:
+            self._vectors, self._ids = None, None
+            return
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float16, mode="r", shape=(rows, self._dim))
+        self._ids = np.memmap(self._ids_path, dtype=np.int64, mode="r", shape=(rows,))
+
+    @staticmethod
+    def _normalise(embedding: np.ndarray) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm > 0 else vector
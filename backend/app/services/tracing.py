@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import threading
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Any, Iterator, Optional
+
+_local = threading.local()
+
+# Bounds the trace a runaway loop of spans could add to a stored analysis.
+MAX_SPANS = 256
+
+
+class StageRecorder:
+    """Collects what services report while one orchestrator stage runs on this thread."""
+
+    def __init__(self) -> None:
+        self.cache_hit: Optional[bool] = None
+        self.details: dict[str, Any] = {}
+        self.spans: list[dict[str, Any]] = []
+        self.origin = perf_counter()
+        self._open: list[dict[str, Any]] = []
+        self._span_count = 0
+
+    def record_cache(self, hit: bool) -> None:
+        # A stage only counts as a hit when every cacheable call in it was served from cache.
+        self.cache_hit = hit if self.cache_hit is None else self.cache_hit and hit
+
+    def record_detail(self, key: str, value: Any) -> None:
+        self.details[key] = value
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        if self._span_count >= MAX_SPANS:
+            yield
+            return
+        self._span_count += 1
+        started = perf_counter()
+        node: dict[str, Any] = {
+            "name": name,
+            "start_offset_ms": round((started - self.origin) * 1000, 2),
+            "duration_ms": None,
+        }
+        siblings = self._open[-1].setdefault("spans", []) if self._open else self.spans
+        siblings.append(node)
+        self._open.append(node)
+        try:
+            yield
+        finally:
+            node["duration_ms"] = round((perf_counter() - started) * 1000, 2)
+            self._open.pop()
+
+
+@contextmanager
+def record_stage() -> Iterator[StageRecorder]:
+    recorder = StageRecorder()
+    previous = getattr(_local, "recorder", None)
+    _local.recorder = recorder
+    try:
+        yield recorder
+    finally:
+        _local.recorder = previous
+
+
+def current() -> Optional[StageRecorder]:
+    return getattr(_local, "recorder", None)
+
+
+def record_cache(hit: bool) -> None:
+    recorder = current()
+    if recorder is not None:
+        recorder.record_cache(hit)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Time a step of the current stage, nested under whichever span is open on this thread."""
+    recorder = current()
+    if recorder is None:
+        yield
+        return
+    with recorder.span(name):
+        yield
+
+
+def record_detail(key: str, value: Any) -> None:
+    recorder = current()
+    if recorder is not None:
+        recorder.record_detail(key, value)
@@ -1,21 +1,134 @@
 from __future__ import annotations
 
 import json
+import queue
 import sqlite3
+import threading
+import zlib
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, List
+from time import sleep, time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
 
 from app import config
 
+COMPLICATIONS = ("dementia", "cardiovascular", "retinopathy", "nephropathy", "neuropathy")
+# Copied out of the JSON columns so history can be filtered and indexed without decoding rows.
+HEADLINE_COLUMNS: tuple[tuple[str, str], ...] = (
+    *((f"{name}_{field}", kind) for name in COMPLICATIONS for field, kind in (("score", "REAL"), ("level", "TEXT"))),
+    ("a1c", "REAL"),
+    ("egfr", "REAL"),
+    ("retinal_grade", "TEXT"),
+)
+
+# Headline values tracked per patient in patient_trends.
+TREND_METRICS = ("a1c", "egfr", *(f"{name}_score" for name in COMPLICATIONS))
+
+_INSERT_ANALYSIS = f"""
+    INSERT INTO analysis_history
+    (created_at, labs_json, lab_insights_json, retinal_json, cognitive_json,
+     agent_trace_json, risks_json, recommendations_json, warnings_json,
+     {", ".join(column for column, _ in HEADLINE_COLUMNS)}, patient_id)
+    VALUES (datetime('now'), ?, ?, ?, ?, ?, ?, ?, ?{", ?" * len(HEADLINE_COLUMNS)}, ?)
+"""
+# Running least-squares sums per (patient, metric); x is days since the patient's first value.
+_UPDATE_TREND = """
+    INSERT INTO patient_trends
+    (patient_id, metric, count, first_day, latest_day, latest, min_value, max_value, sum_x, sum_y, sum_xx, sum_xy)
+    VALUES (:patient_id, :metric, 1, :day, :day, :value, :value, :value, 0, :value, 0, 0)
+    ON CONFLICT (patient_id, metric) DO UPDATE SET
+        count = count + 1,
+        latest_day = excluded.latest_day,
+        latest = excluded.latest,
+        min_value = min(min_value, excluded.latest),
+        max_value = max(max_value, excluded.latest),
+        sum_x = sum_x + (excluded.latest_day - first_day),
+        sum_y = sum_y + excluded.latest,
+        sum_xx = sum_xx + (excluded.latest_day - first_day) * (excluded.latest_day - first_day),
+        sum_xy = sum_xy + (excluded.latest_day - first_day) * excluded.latest
+"""
+# Analysis field -> (column, value when the column is NULL). Reads can project any subset.
+ANALYSIS_FIELDS: Dict[str, tuple[str, Any]] = {
+    "labs": ("labs_json", None),
+    "lab_insights": ("lab_insights_json", None),
+    "retinal": ("retinal_json", None),
+    "cognitive": ("cognitive_json", None),
+    "agent_trace": ("agent_trace_json", []),
+    "risk_scores": ("risks_json", None),
+    "recommendations": ("recommendations_json", None),
+    "warnings": ("warnings_json", None),
+}
+_COMPRESS_MIN_BYTES = 512
+
+_MIN_SLOPE_SPAN_DAYS = 1.0
+_UNIX_EPOCH_JULIAN_DAY = 2440587.5
+
+_PRAGMAS = (
+    # Must precede anything that writes the file header, and only takes effect on a new
+    # database file; an older file switches after one offline VACUUM.
+    "PRAGMA auto_vacuum = INCREMENTAL",
+    "PRAGMA journal_mode = WAL",
+    # With WAL, NORMAL only risks the last transactions on power loss, never corruption.
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -16000",
+    "PRAGMA mmap_size = 134217728",
+)
+
+
+def _julian_to_iso(day: float) -> str:
+    return datetime.fromtimestamp((day - _UNIX_EPOCH_JULIAN_DAY) * 86400, timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
 
 class SQLiteStore:
-    def __init__(self) -> None:
+    """History and cache tables in one SQLite file.
+
+    Connections are long-lived, WAL-mode and shared through a small pool.
+    ``submit_analysis`` hands inserts to a single writer thread that commits
+    whatever has queued up in one transaction; ``close`` flushes it.
+    """
+
+    def __init__(self, pool_size: int | None = None, compress: bool | None = None) -> None:
         self.db_path = Path(config.DB_PATH)
+        self.compress = config.DB_COMPRESS_BLOBS if compress is None else compress
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._pool: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._pool_size = max(1, pool_size or config.DB_POOL_SIZE)
+        self._opened = 0
+        self._pool_lock = threading.Lock()
+        self._writes: "queue.Queue[Optional[tuple[tuple, Future]]]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
         self._init_db()
 
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        for pragma in _PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            with self._pool_lock:
+                can_open = self._opened < self._pool_size
+                self._opened += can_open
+            conn = self._open() if can_open else self._pool.get()
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self._pool.put(conn)
+
     def _init_db(self) -> None:
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connection() as conn:
             conn.execute(
                 """
                 CREATE TABLE IF NOT EXISTS analysis_history (
@@ -35,6 +148,104 @@ class SQLiteStore:
             self._ensure_column(conn, "analysis_history", "cognitive_json", "TEXT")
             self._ensure_column(conn, "analysis_history", "lab_insights_json", "TEXT")
             self._ensure_column(conn, "analysis_history", "agent_trace_json", "TEXT")
+            for column, col_type in HEADLINE_COLUMNS:
+                self._ensure_column(conn, "analysis_history", column, col_type)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_history_created_at ON analysis_history (created_at)")
+            for name in COMPLICATIONS:
+                conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS idx_history_{name}_level ON analysis_history ({name}_level, id)"
+                )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_history_a1c ON analysis_history (a1c)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_history_egfr ON analysis_history (egfr)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_history_retinal_grade ON analysis_history (retinal_grade, id)")
+            self._ensure_column(conn, "analysis_history", "patient_id", "TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_history_patient ON analysis_history (patient_id, id)")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS patient_trends (
+                    patient_id TEXT NOT NULL,
+                    metric TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    first_day REAL NOT NULL,
+                    latest_day REAL NOT NULL,
+                    latest REAL NOT NULL,
+                    min_value REAL NOT NULL,
+                    max_value REAL NOT NULL,
+                    sum_x REAL NOT NULL,
+                    sum_y REAL NOT NULL,
+                    sum_xx REAL NOT NULL,
+                    sum_xy REAL NOT NULL,
+                    PRIMARY KEY (patient_id, metric)
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS lab_parse_cache (
+                    key TEXT PRIMARY KEY,
+                    last_used_at REAL NOT NULL,
+                    result_json TEXT NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_lab_parse_cache_last_used ON lab_parse_cache (last_used_at)"
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS batch_jobs (
+                    id TEXT PRIMARY KEY,
+                    created_at TEXT NOT NULL,
+                    cognitive_notes TEXT
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS batch_job_items (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    job_id TEXT NOT NULL REFERENCES batch_jobs (id),
+                    position INTEGER NOT NULL,
+                    filename TEXT NOT NULL,
+                    spool_path TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    queued_at REAL NOT NULL,
+                    finished_at TEXT,
+                    finished_seq INTEGER,
+                    analysis_id INTEGER,
+                    error TEXT
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_batch_job_items_finished ON batch_job_items (job_id, finished_seq)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_batch_job_items_status ON batch_job_items (status, id)"
+            )
+            # One row per gzip member appended to a monthly archive segment, and where each archived id went.
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS archive_members (
+                    segment TEXT NOT NULL,
+                    offset INTEGER NOT NULL,
+                    length INTEGER NOT NULL,
+                    rows INTEGER NOT NULL,
+                    first_created_at TEXT NOT NULL,
+                    last_created_at TEXT NOT NULL,
+                    PRIMARY KEY (segment, offset)
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS archive_index (
+                    id INTEGER PRIMARY KEY,
+                    segment TEXT NOT NULL,
+                    offset INTEGER NOT NULL
+                )
+                """
+            )
             conn.commit()
 
     def _ensure_column(self, conn: sqlite3.Connection, table: str, column: str, col_type: str) -> None:
@@ -53,57 +264,570 @@ class SQLiteStore:
         recommendations: List[Dict[str, Any]],
         agent_trace: List[Dict[str, Any]],
         warnings: List[str],
+        patient_id: Optional[str] = None,
     ) -> int:
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute(
+        row = self._analysis_row(
+            labs, lab_insights, retinal, cognitive, risks, recommendations, agent_trace, warnings, patient_id
+        )
+        with self._connection() as conn:
+            row_id = self._insert(conn, row)
+            conn.commit()
+            return row_id
+
+    def submit_analysis(
+        self,
+        labs: Dict[str, Any],
+        lab_insights: Dict[str, Any] | None,
+        retinal: Dict[str, Any] | None,
+        cognitive: Dict[str, Any] | None,
+        risks: Dict[str, Any],
+        recommendations: List[Dict[str, Any]],
+        agent_trace: List[Dict[str, Any]],
+        warnings: List[str],
+        patient_id: Optional[str] = None,
+    ) -> "Future[int]":
+        """Queue an insert for the background writer; the future resolves to the new row id."""
+        row = self._analysis_row(
+            labs, lab_insights, retinal, cognitive, risks, recommendations, agent_trace, warnings, patient_id
+        )
+        future: "Future[int]" = Future()
+        self._ensure_writer()
+        self._writes.put((row, future))
+        return future
+
+    def flush(self) -> None:
+        """Block until every submitted insert has been committed."""
+        self._writes.join()
+
+    def close(self) -> None:
+        with self._writer_lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            self._writes.put(None)
+            writer.join()
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._pool_lock:
+            self._opened = 0
+
+    def _ensure_writer(self) -> None:
+        if self._writer is not None:
+            return
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="sqlite-writer", daemon=True)
+                self._writer.start()
+
+    def _write_loop(self) -> None:
+        conn = self._open()
+        try:
+            while True:
+                first = self._writes.get()
+                if first is None:
+                    self._writes.task_done()
+                    return
+                batch = [first]
+                while len(batch) < config.DB_WRITE_BATCH_SIZE:
+                    try:
+                        pending = self._writes.get_nowait()
+                    except queue.Empty:
+                        break
+                    if pending is None:
+                        self._writes.put(None)
+                        self._writes.task_done()
+                        break
+                    batch.append(pending)
+                self._commit_batch(conn, batch)
+                for _ in batch:
+                    self._writes.task_done()
+        finally:
+            conn.close()
+
+    def _commit_batch(self, conn: sqlite3.Connection, batch: list[tuple[tuple, Future]]) -> None:
+        try:
+            ids = [self._insert(conn, row) for row, _ in batch]
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            # Retry one by one so a single bad row does not fail the whole group.
+            for row, future in batch:
+                try:
+                    row_id = self._insert(conn, row)
+                    conn.commit()
+                    future.set_result(row_id)
+                except Exception as exc:
+                    conn.rollback()
+                    future.set_exception(exc)
+            return
+        for (_, future), row_id in zip(batch, ids):
+            future.set_result(row_id)
+
+    def _analysis_row(
+        self,
+        labs: Dict[str, Any],
+        lab_insights: Dict[str, Any] | None,
+        retinal: Dict[str, Any] | None,
+        cognitive: Dict[str, Any] | None,
+        risks: Dict[str, Any],
+        recommendations: List[Dict[str, Any]],
+        agent_trace: List[Dict[str, Any]],
+        warnings: List[str],
+        patient_id: Optional[str] = None,
+    ) -> tuple:
+        # Only the large columns are packed; labs carries the report's full OCR text.
+        return (
+            self._pack(labs),
+            json.dumps(lab_insights) if lab_insights else None,
+            json.dumps(retinal) if retinal else None,
+            json.dumps(cognitive) if cognitive else None,
+            self._pack(agent_trace),
+            json.dumps(risks),
+            self._pack(recommendations),
+            json.dumps(warnings),
+            *self._headline(labs, retinal, risks),
+            patient_id,
+        )
+
+    @staticmethod
+    def _insert(conn: sqlite3.Connection, row: tuple) -> int:
+        row_id = int(conn.execute(_INSERT_ANALYSIS, row).lastrowid)
+        patient_id = row[-1]
+        if patient_id is not None:
+            # Trend sums move in the same transaction as the row, so they never drift from history.
+            headline = dict(zip((column for column, _ in HEADLINE_COLUMNS), row[8:-1]))
+            day = time() / 86400 + _UNIX_EPOCH_JULIAN_DAY  # as SQLite's julianday()
+            conn.executemany(
+                _UPDATE_TREND,
+                [
+                    {"patient_id": patient_id, "metric": metric, "day": day, "value": headline[metric]}
+                    for metric in TREND_METRICS
+                    if headline[metric] is not None
+                ],
+            )
+        return row_id
+
+    def _pack(self, value: Any) -> str | bytes:
+        text = json.dumps(value)
+        if self.compress and len(text) >= _COMPRESS_MIN_BYTES:
+            return zlib.compress(text.encode("utf-8"))
+        return text
+
+    @staticmethod
+    def _unpack(value: str | bytes | None) -> Any:
+        # Compressed values are BLOBs; rows written uncompressed (or before compression) are TEXT.
+        if value is None:
+            return None
+        if isinstance(value, bytes):
+            value = zlib.decompress(value)
+        return json.loads(value)
+
+    @staticmethod
+    def _headline(labs: Dict[str, Any], retinal: Dict[str, Any] | None, risks: Dict[str, Any]) -> tuple:
+        values: list[Any] = []
+        for name in COMPLICATIONS:
+            risk = risks.get(name) or {}
+            values += [risk.get("score"), risk.get("level")]
+        lab_values = labs.get("values") or {}
+        values += [lab_values.get("a1c"), lab_values.get("egfr"), (retinal or {}).get("grade")]
+        return tuple(values)
+
+    def start_backfill(self) -> threading.Thread:
+        """Fill headline columns of rows written before they existed, in the background."""
+        thread = threading.Thread(target=self.backfill_headlines, name="sqlite-backfill", daemon=True)
+        thread.start()
+        return thread
+
+    def backfill_headlines(self, batch_size: int = 500) -> int:
+        # Every stored analysis has a dementia score, so NULL marks a row that predates the columns.
+        assignments = ", ".join(f"{column} = ?" for column, _ in HEADLINE_COLUMNS)
+        last_id, updated = 0, 0
+        while True:
+            with self._connection() as conn:
+                rows = conn.execute(
+                    """
+                    SELECT id, labs_json, retinal_json, risks_json FROM analysis_history
+                    WHERE dementia_score IS NULL AND id > ?
+                    ORDER BY id
+                    LIMIT ?
+                    """,
+                    (last_id, batch_size),
+                ).fetchall()
+                if not rows:
+                    return updated
+                changes = []
+                for row_id, labs_json, retinal_json, risks_json in rows:
+                    try:
+                        headline = self._headline(
+                            self._unpack(labs_json), self._unpack(retinal_json), self._unpack(risks_json)
+                        )
+                    except (ValueError, TypeError, AttributeError, zlib.error):
+                        continue
+                    changes.append((*headline, row_id))
+                conn.executemany(f"UPDATE analysis_history SET {assignments} WHERE id = ?", changes)
+                conn.commit()
+            last_id = rows[-1][0]
+            updated += len(changes)
+            # Let request-path writers take the write lock between batches.
+            sleep(0.01)
+
+    def fetch_recent(self, limit: int = 10) -> List[Dict[str, Any]]:
+        return self.fetch_history(limit=limit)[0]
+
+    def fetch_history(
+        self,
+        limit: int = 10,
+        before_id: Optional[int] = None,
+        complication: Optional[str] = None,
+        level: Optional[str] = None,
+        min_score: Optional[float] = None,
+        since_days: Optional[int] = None,
+        min_a1c: Optional[float] = None,
+        max_egfr: Optional[float] = None,
+        retinal_grade: Optional[str] = None,
+        fields: Optional[Sequence[str]] = None,
+        patient_id: Optional[str] = None,
+    ) -> tuple[List[Dict[str, Any]], Optional[int]]:
+        """Newest-first page of history plus the cursor for the next page (``None`` on the last one).
+
+        Pass the returned cursor back as ``before_id``. Filters use the indexed
+        headline columns, so rows are only decoded once they match; ``fields``
+        limits which of ``ANALYSIS_FIELDS`` are read and decoded at all.
+        """
+        select = self._projection(fields)
+        clauses, params = [], []
+        if before_id is not None:
+            clauses.append("id < ?")
+            params.append(before_id)
+        if complication is not None:
+            if complication not in COMPLICATIONS:
+                raise ValueError(f"Unknown complication: {complication}")
+            if level is not None:
+                clauses.append(f"{complication}_level = ?")
+                params.append(level)
+            if min_score is not None:
+                clauses.append(f"{complication}_score >= ?")
+                params.append(min_score)
+        if since_days is not None:
+            clauses.append("created_at >= datetime('now', ?)")
+            params.append(f"-{int(since_days)} days")
+        if min_a1c is not None:
+            clauses.append("a1c >= ?")
+            params.append(min_a1c)
+        if max_egfr is not None:
+            clauses.append("egfr <= ?")
+            params.append(max_egfr)
+        if retinal_grade is not None:
+            clauses.append("retinal_grade = ?")
+            params.append(retinal_grade)
+        if patient_id is not None:
+            clauses.append("patient_id = ?")
+            params.append(patient_id)
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._connection() as conn:
+            rows = conn.execute(
+                f"SELECT {select} FROM analysis_history {where} ORDER BY id DESC LIMIT ?",
+                (*params, limit),
+            ).fetchall()
+
+        items = [self._row_to_analysis(row, fields) for row in rows]
+        return items, items[-1]["id"] if len(items) == limit else None
+
+    def iter_history(
+        self,
+        fields: Optional[Sequence[str]] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        chunk_size: int = 500,
+        read_member: Optional[Callable[[str, int, int], List[Dict[str, Any]]]] = None,
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """Every analysis in id order, ``chunk_size`` decoded rows at a time.
+
+        Runs on its own connection rather than a pooled one, so a long export
+        neither holds a pool slot nor sees rows committed after it started.
+        ``since`` and ``until`` bound ``created_at`` (``since`` inclusive).
+        With ``read_member``, archived analyses come first, one archive member
+        at a time; the member list is read in the same snapshot as the live
+        rows, so compaction running meanwhile neither drops nor repeats a row.
+        """
+        select = self._projection(fields)
+        clauses, params = [], []
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("created_at < ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        conn = self._open()
+        # A full scan through the memory map would leave up to mmap_size of the file resident.
+        conn.execute("PRAGMA mmap_size = 0")
+        try:
+            conn.execute("BEGIN")
+            if read_member is not None:
+                members = conn.execute(
+                    "SELECT segment, offset, length, first_created_at, last_created_at "
+                    "FROM archive_members ORDER BY segment, offset"
+                ).fetchall()
+                for segment, offset, length, first_created_at, last_created_at in members:
+                    if (since is not None and last_created_at < since) or (
+                        until is not None and first_created_at >= until
+                    ):
+                        continue
+                    archived = [
+                        self.project(row, fields)
+                        for row in read_member(segment, offset, length)
+                        if (since is None or row["created_at"] >= since)
+                        and (until is None or row["created_at"] < until)
+                    ]
+                    if archived:
+                        yield archived
+            cursor = conn.execute(f"SELECT {select} FROM analysis_history {where} ORDER BY id", params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    return
+                yield [self._row_to_analysis(row, fields) for row in rows]
+        finally:
+            conn.close()
+
+    def fetch_by_id(self, analysis_id: int, fields: Optional[Sequence[str]] = None) -> Optional[Dict[str, Any]]:
+        with self._connection() as conn:
+            row = conn.execute(
+                f"SELECT {self._projection(fields)} FROM analysis_history WHERE id = ?",
+                (analysis_id,),
+            ).fetchone()
+        return self._row_to_analysis(row, fields) if row else None
+
+    @staticmethod
+    def project(analysis: Dict[str, Any], fields: Optional[Sequence[str]]) -> Dict[str, Any]:
+        """Apply a ``fields`` projection to a fully decoded analysis."""
+        if fields is None:
+            return analysis
+        keys = ("id", "created_at", "patient_id", *fields)
+        return {key: analysis.get(key) for key in keys}
+
+    @staticmethod
+    def _projection(fields: Optional[Sequence[str]]) -> str:
+        unknown = set(fields or ()) - ANALYSIS_FIELDS.keys()
+        if unknown:
+            raise ValueError(f"Unknown history fields: {', '.join(sorted(unknown))}")
+        names = ANALYSIS_FIELDS if fields is None else fields
+        return ", ".join(["id", "created_at", "patient_id", *(ANALYSIS_FIELDS[name][0] for name in names)])
+
+    def _row_to_analysis(self, row: tuple, fields: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        analysis: Dict[str, Any] = {"id": row[0], "created_at": row[1], "patient_id": row[2]}
+        for name, value in zip(ANALYSIS_FIELDS if fields is None else fields, row[3:]):
+            analysis[name] = ANALYSIS_FIELDS[name][1] if value is None else self._unpack(value)
+        return analysis
+
+    def fetch_patient_trends(self, patient_id: str) -> Dict[str, Dict[str, Any]]:
+        """Latest, min, max and least-squares slope (per day) of each tracked metric for one patient."""
+        with self._connection() as conn:
+            rows = conn.execute(
+                """
+                SELECT metric, count, first_day, latest_day, latest, min_value, max_value,
+                       sum_x, sum_y, sum_xx, sum_xy
+                FROM patient_trends
+                WHERE patient_id = ?
+                """,
+                (patient_id,),
+            ).fetchall()
+        trends = {}
+        for metric, count, first_day, latest_day, latest, min_value, max_value, sx, sy, sxx, sxy in rows:
+            slope = None
+            # Repeat runs within a day say nothing about a trend and make the fit ill-conditioned.
+            if latest_day - first_day >= _MIN_SLOPE_SPAN_DAYS:
+                slope = (count * sxy - sx * sy) / (count * sxx - sx * sx)
+            trends[metric] = {
+                "count": count,
+                "first_at": _julian_to_iso(first_day),
+                "latest_at": _julian_to_iso(latest_day),
+                "latest": latest,
+                "min": min_value,
+                "max": max_value,
+                "slope_per_day": slope,
+            }
+        return trends
+
+    def fetch_expired(self, before: str, limit: int) -> List[Dict[str, Any]]:
+        """Oldest analyses created before ``before``, fully decoded, for archiving."""
+        with self._connection() as conn:
+            rows = conn.execute(
+                f"SELECT {self._projection(None)} FROM analysis_history WHERE created_at < ? ORDER BY id LIMIT ?",
+                (before, limit),
+            ).fetchall()
+        return [self._row_to_analysis(row) for row in rows]
+
+    def archive_members(self, segment: Optional[str] = None) -> List[Dict[str, Any]]:
+        query = "SELECT segment, offset, length, rows, first_created_at, last_created_at FROM archive_members"
+        params: tuple = ()
+        if segment is not None:
+            query += " WHERE segment = ?"
+            params = (segment,)
+        with self._connection() as conn:
+            rows = conn.execute(query + " ORDER BY segment, offset", params).fetchall()
+        keys = ("segment", "offset", "length", "rows", "first_created_at", "last_created_at")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def archive_location(self, analysis_id: int) -> Optional[tuple[str, int, int]]:
+        with self._connection() as conn:
+            return conn.execute(
+                """
+                SELECT i.segment, i.offset, m.length FROM archive_index i
+                JOIN archive_members m ON m.segment = i.segment AND m.offset = i.offset
+                WHERE i.id = ?
+                """,
+                (analysis_id,),
+            ).fetchone()
+
+    def commit_archived(self, member: Dict[str, Any], ids: Sequence[int]) -> None:
+        """Record an appended archive member and drop its rows from the live table, atomically."""
+        with self._connection() as conn:
+            conn.execute(
                 """
-                INSERT INTO analysis_history
-                (created_at, labs_json, lab_insights_json, retinal_json, cognitive_json,
-                 agent_trace_json, risks_json, recommendations_json, warnings_json)
-                VALUES (datetime('now'), ?, ?, ?, ?, ?, ?, ?, ?)
+                INSERT INTO archive_members (segment, offset, length, rows, first_created_at, last_created_at)
+                VALUES (:segment, :offset, :length, :rows, :first_created_at, :last_created_at)
                 """,
-                (
-                    json.dumps(labs),
-                    json.dumps(lab_insights) if lab_insights else None,
-                    json.dumps(retinal) if retinal else None,
-                    json.dumps(cognitive) if cognitive else None,
-                    json.dumps(agent_trace),
-                    json.dumps(risks),
-                    json.dumps(recommendations),
-                    json.dumps(warnings),
-                ),
+                member,
             )
+            conn.executemany(
+                "INSERT OR REPLACE INTO archive_index (id, segment, offset) VALUES (?, ?, ?)",
+                [(analysis_id, member["segment"], member["offset"]) for analysis_id in ids],
+            )
+            conn.executemany("DELETE FROM analysis_history WHERE id = ?", [(analysis_id,) for analysis_id in ids])
             conn.commit()
-            return int(cursor.lastrowid)
 
-    def fetch_recent(self, limit: int = 10) -> List[Dict[str, Any]]:
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute(
+    def incremental_vacuum(self, pages: int) -> int:
+        """Return up to ``pages`` free pages to the filesystem; the free pages left afterwards."""
+        with self._connection() as conn:
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                return 0
+            conn.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+            conn.commit()
+            return conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+    def fetch_parse_result(self, key: str) -> Optional[str]:
+        with self._connection() as conn:
+            row = conn.execute("SELECT result_json FROM lab_parse_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE lab_parse_cache SET last_used_at = ? WHERE key = ?", (time(), key))
+            conn.commit()
+            return row[0]
+
+    def save_parse_result(self, key: str, result_json: str, max_entries: int) -> None:
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO lab_parse_cache (key, last_used_at, result_json) VALUES (?, ?, ?)",
+                (key, time(), result_json),
+            )
+            (count,) = conn.execute("SELECT COUNT(*) FROM lab_parse_cache").fetchone()
+            if count > max_entries:
+                # Walks the last_used_at index from the oldest end instead of ranking every row.
+                conn.execute(
+                    """
+                    DELETE FROM lab_parse_cache
+                    WHERE last_used_at <= (
+                        SELECT last_used_at FROM lab_parse_cache ORDER BY last_used_at LIMIT 1 OFFSET ?
+                    )
+                    """,
+                    (count - max_entries - 1,),
+                )
+            conn.commit()
+
+    def create_batch_job(self, job_id: str, cognitive_notes: Optional[str], items: List[tuple[str, str]]) -> None:
+        queued_at = time()
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT INTO batch_jobs (id, created_at, cognitive_notes) VALUES (?, datetime('now'), ?)",
+                (job_id, cognitive_notes),
+            )
+            conn.executemany(
+                """
+                INSERT INTO batch_job_items (job_id, position, filename, spool_path, status, queued_at)
+                VALUES (?, ?, ?, ?, 'queued', ?)
+                """,
+                [(job_id, position, filename, path, queued_at) for position, (filename, path) in enumerate(items)],
+            )
+            conn.commit()
+
+    def claim_batch_item(self) -> Optional[Dict[str, Any]]:
+        """Mark the oldest queued item as running and return it, or ``None`` when nothing is queued."""
+        with self._connection() as conn:
+            while True:
+                row = conn.execute(
+                    """
+                    SELECT items.id, items.job_id, items.position, items.filename, items.spool_path,
+                           items.queued_at, jobs.cognitive_notes
+                    FROM batch_job_items AS items
+                    JOIN batch_jobs AS jobs ON jobs.id = items.job_id
+                    WHERE items.status = 'queued'
+                    ORDER BY items.id
+                    LIMIT 1
+                    """
+                ).fetchone()
+                if row is None:
+                    return None
+                claimed = conn.execute(
+                    "UPDATE batch_job_items SET status = 'running' WHERE id = ? AND status = 'queued'",
+                    (row[0],),
+                ).rowcount
+                conn.commit()
+                if claimed:
+                    keys = ("id", "job_id", "position", "filename", "spool_path", "queued_at", "cognitive_notes")
+                    return dict(zip(keys, row))
+
+    def finish_batch_item(self, item_id: int, analysis_id: Optional[int] = None, error: Optional[str] = None) -> None:
+        with self._connection() as conn:
+            conn.execute(
+                """
+                UPDATE batch_job_items
+                SET status = ?, analysis_id = ?, error = ?, finished_at = datetime('now'),
+                    finished_seq = (
+                        SELECT COALESCE(MAX(finished_seq), 0) + 1 FROM batch_job_items
+                        WHERE job_id = (SELECT job_id FROM batch_job_items WHERE id = ?)
+                    )
+                WHERE id = ?
+                """,
+                ("failed" if error is not None else "done", analysis_id, error, item_id, item_id),
+            )
+            conn.commit()
+
+    def requeue_running_batch_items(self) -> int:
+        with self._connection() as conn:
+            count = conn.execute("UPDATE batch_job_items SET status = 'queued' WHERE status = 'running'").rowcount
+            conn.commit()
+            return count
+
+    def fetch_batch_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._connection() as conn:
+            job = conn.execute("SELECT id, created_at FROM batch_jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            counts = dict(
+                conn.execute(
+                    "SELECT status, COUNT(*) FROM batch_job_items WHERE job_id = ? GROUP BY status",
+                    (job_id,),
+                ).fetchall()
+            )
+        return {"id": job[0], "created_at": job[1], "counts": counts}
+
+    def fetch_batch_results(self, job_id: str, after: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
+        """Finished items in completion order; pass the last ``finished_seq`` seen as ``after``."""
+        with self._connection() as conn:
+            rows = conn.execute(
                 """
-                SELECT id, created_at, labs_json, lab_insights_json, retinal_json, cognitive_json,
-                       agent_trace_json, risks_json, recommendations_json, warnings_json
-                FROM analysis_history
-                ORDER BY id DESC
+                SELECT finished_seq, position, filename, status, finished_at, analysis_id, error
+                FROM batch_job_items
+                WHERE job_id = ? AND finished_seq > ?
+                ORDER BY finished_seq
                 LIMIT ?
                 """,
-                (limit,),
-            )
-            rows = cursor.fetchall()
-
-        results = []
-        for row in rows:
-            results.append(
-                {
-                    "id": row[0],
-                    "created_at": row[1],
-                    "labs": json.loads(row[2]),
-                    "lab_insights": json.loads(row[3]) if row[3] else None,
-                    "retinal": json.loads(row[4]) if row[4] else None,
-                    "cognitive": json.loads(row[5]) if row[5] else None,
-                    "agent_trace": json.loads(row[6]) if row[6] else [],
-                    "risk_scores": json.loads(row[7]),
-                    "recommendations": json.loads(row[8]),
-                    "warnings": json.loads(row[9]),
-                }
-            )
-        return results
+                (job_id, after, limit),
+            ).fetchall()
+        keys = ("finished_seq", "position", "filename", "status", "finished_at", "analysis_id", "error")
+        return [dict(zip(keys, row)) for row in rows]
@@ -0,0 +1,89 @@
+"""Check the vectorised cohort scorer against RiskScorer and measure its throughput.
+
+Patients are drawn with values clustered around every rule threshold (exact
+threshold values included) and a share of missing labs, cognitive scores and
+retinal grades. Every row must give the same score, level and key factors as
+``RiskScorer.score``.
+
+Run from ``backend/``::
+
+    python -m benchmarks.cohort_risk --patients 20000 --cohort 1000000
+"""
+from __future__ import annotations
+
+import argparse
+import random
+from time import perf_counter
+
+import numpy as np
+
+from app.schemas import CognitiveResult, LabValues, RetinalResult
+from app.services.cohort_risk import COMPLICATIONS, columns_from, score_cohort
+from app.services.risk import RiskScorer
+
+# Values straddling each threshold RiskScorer uses.
+CANDIDATES = {
+    "a1c": [5.5, 6.99, 7.0, 7.4, 7.5, 7.9, 8.0, 11.2],
+    "systolic_bp": [110, 139.9, 140, 182],
+    "ldl": [80, 129.5, 130, 190],
+    "egfr": [25, 59.9, 60, 95],
+    "urine_albumin": [5, 29.9, 30, 300],
+}
+GRADES = ["None", "Mild NPDR", "Unknown", "Not Analyzed"]
+
+
+def random_patient(rng: random.Random) -> tuple[LabValues, RetinalResult | None, CognitiveResult | None]:
+    labs = LabValues(
+        **{name: rng.choice(values) if rng.random() > 0.2 else None for name, values in CANDIDATES.items()}
+    )
+    retinal = RetinalResult(grade=rng.choice(GRADES)) if rng.random() > 0.3 else None
+    cognitive = None
+    if rng.random() > 0.3:
+        cognitive = CognitiveResult(score=rng.choice([None, 0, 1, 2, 2.5, 3, 3.5, 4, 5]))
+    return labs, retinal, cognitive
+
+
+def random_columns(size: int, seed: int) -> dict[str, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for name, values in CANDIDATES.items():
+        column = rng.choice(np.array(values, dtype=np.float64), size)
+        column[rng.random(size) < 0.2] = np.nan
+        columns[name] = column
+    cognitive = rng.choice(np.array([0, 1, 2, 2.5, 3, 3.5, 4, 5], dtype=np.float64), size)
+    cognitive[rng.random(size) < 0.3] = np.nan
+    columns["cognitive_score"] = cognitive
+    columns["retinal_graded"] = (rng.random(size) < 0.5).astype(np.float64)
+    return columns
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--patients", type=int, default=20000, help="patients in the equivalence check")
+    parser.add_argument("--cohort", type=int, default=1_000_000, help="patients in the timing run")
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    patients = [random_patient(rng) for _ in range(args.patients)]
+    labs, retinal, cognitive = (list(column) for column in zip(*patients))
+    cohort = score_cohort(columns_from(labs, retinal, cognitive))
+    scorer = RiskScorer()
+    for row, patient in enumerate(patients):
+        expected = scorer.score(*patient)
+        if cohort.risk_scores(row) != expected:
+            raise SystemExit(f"Mismatch for {patient}:\nexpected {expected}\nactual   {cohort.risk_scores(row)}")
+    print(f"equivalence: {args.patients} patients identical across {len(COMPLICATIONS)} complications")
+
+    columns = random_columns(args.cohort, args.seed)
+    score_cohort(columns)
+    runs = 5
+    started = perf_counter()
+    for _ in range(runs):
+        score_cohort(columns)
+    elapsed = (perf_counter() - started) / runs
+    print(f"cohort: {args.cohort} patients in {elapsed * 1000:.1f} ms ({args.cohort / elapsed / 1e6:.1f}M patients/s)")
+
+
+if __name__ == "__main__":
+    main()
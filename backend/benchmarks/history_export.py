@@ -0,0 +1,70 @@
+"""Check that streaming history exports run in flat memory, and measure their throughput.
+
+Databases of increasing size are filled with generated analyses, then each is
+exported as NDJSON and CSV in a fresh process that discards the output. Peak
+RSS should stay about the same as the table grows.
+
+Run from ``backend/``::
+
+    python -m benchmarks.history_export --rows 10000 100000
+"""
+from __future__ import annotations
+
+import argparse
+import multiprocessing
+import tempfile
+from pathlib import Path
+from time import perf_counter
+
+from app import config
+from app.services.history_export import export_history
+from app.storage import SQLiteStore
+from benchmarks.history_reads import build
+from benchmarks.retinal_decode import _peak_rss_mb
+
+
+def _export(db_path: str, fmt: str, results) -> None:
+    config.DB_PATH = db_path
+    store = SQLiteStore()
+    baseline_mb = _peak_rss_mb()
+    started = perf_counter()
+    written = sum(len(block) for block in export_history(store, fmt))
+    results.put((perf_counter() - started, written, _peak_rss_mb() - baseline_mb))
+    store.close()
+
+
+def measure(db_path: str, fmt: str) -> tuple[float, int, float]:
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_export, args=(db_path, fmt, results))
+    process.start()
+    outcome = results.get()
+    process.join()
+    return outcome
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", nargs="*", type=int, default=[10_000, 100_000])
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--workdir", default=None, help="directory for the databases (default: a temp dir)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(args.workdir or tmp)
+        workdir.mkdir(parents=True, exist_ok=True)
+        for rows in args.rows:
+            config.DB_PATH = str(workdir / f"history_{rows}.db")
+            store = SQLiteStore()
+            build(store, rows, args.seed)
+            store.close()
+            for fmt in ("ndjson", "csv"):
+                elapsed, written, peak_mb = measure(config.DB_PATH, fmt)
+                print(
+                    f"{rows:>9} rows {fmt:>6}: {rows / elapsed:8.0f} rows/s, "
+                    f"{written / 1e6:8.1f} MB written, peak RSS +{peak_mb:6.1f} MB"
+                )
+
+
+if __name__ == "__main__":
+    main()
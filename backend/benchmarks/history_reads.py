@@ -0,0 +1,102 @@
+"""Measure history database size and ``/api/history`` read latency with and without blob compression.
+
+Two databases are filled with the same generated analyses: ``plain`` stores
+every JSON column as text (how rows were written before compression), and
+``compressed`` stores the large ones zlib-compressed. Each read is timed the
+way the endpoint does the work: fetch, decode and serialise the page to JSON.
+
+- ``full``: a page with every field, the previous endpoint behaviour
+- ``projected``: a page with only ``risk_scores`` and ``warnings``
+- ``filtered``: high nephropathy risk in the last 30 days, projected
+- ``deep``: a projected page half-way through the table via the ``before`` cursor
+
+Run from ``backend/``::
+
+    python -m benchmarks.history_reads --rows 100000
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import tempfile
+from pathlib import Path
+from statistics import median
+from time import perf_counter
+
+from app import config
+from app.storage import _INSERT_ANALYSIS, COMPLICATIONS, SQLiteStore
+from benchmarks.history_writes import sample_analysis
+
+DASHBOARD_FIELDS = ("risk_scores", "warnings")
+ANALYTES = ("Hemoglobin A1c", "Glucose", "LDL Cholesterol", "HDL Cholesterol", "Triglycerides", "eGFR", "Creatinine")
+
+
+def random_analysis(rng: random.Random) -> dict:
+    analysis = sample_analysis()
+    analysis["labs"]["raw_text"] = "\n".join(
+        f"{rng.choice(ANALYTES)} {rng.uniform(1, 250):.1f} mg/dL reference {rng.randint(1, 99)} - {rng.randint(100, 200)}"
+        for _ in range(rng.randint(40, 120))
+    )
+    analysis["labs"]["values"] = {"a1c": round(rng.uniform(5, 11), 1), "egfr": round(rng.uniform(20, 110))}
+    for name in COMPLICATIONS:
+        score = round(rng.uniform(10, 90), 1)
+        level = "High" if score >= 60 else "Moderate" if score >= 35 else "Low"
+        analysis["risks"][name] = {**analysis["risks"][name], "score": score, "level": level}
+    return analysis
+
+
+def build(store: SQLiteStore, rows: int, seed: int) -> None:
+    rng = random.Random(seed)
+    with store._connection() as conn:
+        for start in range(0, rows, 5000):
+            batch = [store._analysis_row(**random_analysis(rng)) for _ in range(min(5000, rows - start))]
+            conn.executemany(_INSERT_ANALYSIS, batch)
+            conn.commit()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+def timed(read, repeats: int) -> float:
+    read()
+    samples = []
+    for _ in range(repeats):
+        started = perf_counter()
+        json.dumps(read())
+        samples.append((perf_counter() - started) * 1000)
+    return median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--limit", type=int, default=50, help="rows per history page")
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--workdir", default=None, help="directory for the databases (default: a temp dir)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(args.workdir or tmp)
+        workdir.mkdir(parents=True, exist_ok=True)
+        for mode in ("plain", "compressed"):
+            config.DB_PATH = str(workdir / f"{mode}.db")
+            store = SQLiteStore(compress=mode == "compressed")
+            build(store, args.rows, args.seed)
+            size_mb = Path(config.DB_PATH).stat().st_size / 1e6
+            reads = {
+                "full": lambda: store.fetch_history(limit=args.limit),
+                "projected": lambda: store.fetch_history(limit=args.limit, fields=DASHBOARD_FIELDS),
+                "filtered": lambda: store.fetch_history(
+                    limit=args.limit, complication="nephropathy", level="High", since_days=30, fields=DASHBOARD_FIELDS
+                ),
+                "deep": lambda: store.fetch_history(
+                    limit=args.limit, before_id=args.rows // 2, fields=DASHBOARD_FIELDS
+                ),
+            }
+            latencies = ", ".join(f"{name} {timed(read, args.repeats):6.2f} ms" for name, read in reads.items())
+            print(f"{mode:>10}: {args.rows} rows, {size_mb:7.1f} MB | page of {args.limit}: {latencies}")
+            store.close()
+
+
+if __name__ == "__main__":
+    main()
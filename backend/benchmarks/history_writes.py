@@ -0,0 +1,135 @@
+"""Measure analysis inserts/sec and per-request persist latency for the history store.
+
+Modes:
+
+- ``legacy``: a new connection and a synchronous, default-journal commit per insert
+  (how ``SQLiteStore.insert_analysis`` worked before the pooled store)
+- ``pooled``: ``insert_analysis`` on pooled WAL connections, still committing on the request path
+- ``writer``: ``submit_analysis``, handing the insert to the background group-commit writer
+
+Run from ``backend/``::
+
+    python -m benchmarks.history_writes --concurrency 8 --requests 500
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sqlite3
+import tempfile
+import threading
+from pathlib import Path
+from statistics import quantiles
+from time import perf_counter
+
+from app import config
+from app.storage import SQLiteStore
+
+
+def sample_analysis() -> dict:
+    raw_text = "\n".join(f"Line {i}: Hemoglobin A1c 7.{i % 10} % reference 4.0 - 5.6" for i in range(80))
+    risk = {"score": 42.0, "level": "Moderate", "key_factors": ["A1C above 7%"], "protective_factors": []}
+    return {
+        "labs": {
+            "values": {"a1c": 7.4, "egfr": 72.0},
+            "raw_text": raw_text,
+            "missing_fields": [],
+            "quality_flags": [],
+        },
+        "lab_insights": {"summary": "A1C above target.", "flags": ["a1c_high"]},
+        "retinal": None,
+        "cognitive": {"score": 3.0, "summary": "Borderline recall.", "flags": []},
+        "risks": {
+            name: risk for name in ("dementia", "cardiovascular", "retinopathy", "nephropathy", "neuropathy")
+        },
+        "recommendations": [
+            {"title": f"Recommendation {i}", "expected_impact": "Moderate", "rationale": "Because." * 20}
+            for i in range(3)
+        ],
+        "agent_trace": [{"agent": f"Agent {i}", "status": "ok", "duration_ms": 100 * i} for i in range(7)],
+        "warnings": [],
+    }
+
+
+def legacy_insert(db_path: Path, analysis: dict) -> int:
+    with sqlite3.connect(db_path) as conn:
+        cursor = conn.execute(
+            """
+            INSERT INTO analysis_history
+            (created_at, labs_json, lab_insights_json, retinal_json, cognitive_json,
+             agent_trace_json, risks_json, recommendations_json, warnings_json)
+            VALUES (datetime('now'), ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                json.dumps(analysis["labs"]),
+                json.dumps(analysis["lab_insights"]),
+                None,
+                json.dumps(analysis["cognitive"]),
+                json.dumps(analysis["agent_trace"]),
+                json.dumps(analysis["risks"]),
+                json.dumps(analysis["recommendations"]),
+                json.dumps(analysis["warnings"]),
+            ),
+        )
+        conn.commit()
+        return int(cursor.lastrowid)
+
+
+def run(mode: str, workdir: Path, concurrency: int, requests: int) -> tuple[float, float, float]:
+    db_path = workdir / f"{mode}.db"
+    config.DB_PATH = str(db_path)
+    store = SQLiteStore()
+    if mode == "legacy":
+        # The store left the file in WAL mode; leaving WAL needs its pooled connections closed.
+        store.close()
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("PRAGMA journal_mode = DELETE")
+    persist = {
+        "legacy": lambda analysis: legacy_insert(db_path, analysis),
+        "pooled": lambda analysis: store.insert_analysis(**analysis),
+        "writer": lambda analysis: store.submit_analysis(**analysis),
+    }[mode]
+    analysis = sample_analysis()
+    latencies: list[float] = []
+    lock = threading.Lock()
+
+    def client() -> None:
+        samples = []
+        for _ in range(requests):
+            started = perf_counter()
+            persist(analysis)
+            samples.append((perf_counter() - started) * 1000)
+        with lock:
+            latencies.extend(samples)
+
+    started = perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    store.flush()
+    elapsed = perf_counter() - started
+    store.close()
+
+    cuts = quantiles(latencies, n=100)
+    return len(latencies) / elapsed, cuts[49], cuts[98]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=500, help="inserts per concurrent client")
+    parser.add_argument("--workdir", default=None, help="directory for the databases (default: a temp dir)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(args.workdir or tmp)
+        workdir.mkdir(parents=True, exist_ok=True)
+        for mode in ("legacy", "pooled", "writer"):
+            rate, p50, p99 = run(mode, workdir, args.concurrency, args.requests)
+            print(f"{mode:>7}: {rate:8.0f} inserts/s | persist latency p50 {p50:7.3f} ms, p99 {p99:7.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""Check the compiled lab value extractor against the original implementation and time both.
+
+The reference below is the per-field, per-line regex scan LabParser used before
+the single-pass engine. Every document in a generated golden corpus must give
+identical values, missing fields and quality flags.
+
+Run from ``backend/``::
+
+    python -m benchmarks.lab_extraction --documents 2000 --pages 40
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import re
+from time import perf_counter
+
+from app.schemas import LabValues
+from app.services.lab_parser import LabParser
+
+LABEL_VARIANTS = {
+    "a1c": ["A1C", "Hemoglobin A1c", "HbA1c", "HBA1C (NGSP)"],
+    "fasting_glucose": ["Fasting Glucose", "Glucose, Fasting", "FPG"],
+    "egfr": ["eGFR", "Estimated GFR", "eGFR (CKD-EPI)"],
+    "creatinine": ["Creatinine", "Serum Creatinine"],
+    "ldl": ["LDL", "LDL Cholesterol", "LDL-C"],
+    "hdl": ["HDL", "HDL Cholesterol"],
+    "triglycerides": ["Triglycerides", "TG"],
+    "urine_albumin": ["Urine Albumin", "Albumin/Creatinine Ratio", "ACR"],
+}
+WHITESPACE = re.compile(r"\s+")
+UNITS = ["%", "mg/dL", "mmol/L", "mL/min/1.73m2", "mg/g", "umol/L", ""]
+NOISE = [
+    "Patient: Jane Doe   DOB 01/02/1960",
+    "Collected 2024-03-04 08:15   Reported 2024-03-05",
+    "Reference range 70 - 99",
+    "Page {page} of {pages}",
+    "Comment: specimen received ambient",
+    "Ordering physician: Dr. Smith, MD",
+    "Sodium 139 mmol/L",
+    "Potassium 4.2 mmol/L",
+    "",
+    "   ",
+]
+
+
+def reference_extract(parser: LabParser, text: str) -> tuple[LabValues, list[str], list[str]]:
+    values = LabValues()
+    missing: list[str] = []
+    flags: list[str] = []
+
+    lines = [WHITESPACE.sub(" ", line).strip() for line in text.splitlines() if line.strip()]
+
+    def find_value(labels: list[str], value_pattern: str, units: list[str] | None = None) -> float | None:
+        for line in lines:
+            if not any(re.search(label, line, re.IGNORECASE) for label in labels):
+                continue
+            pattern = value_pattern
+            if units:
+                unit_pattern = r"(?:\s*(?:" + "|".join(units) + r"))?"
+                pattern = value_pattern + unit_pattern
+            match = re.search(pattern, line, re.IGNORECASE)
+            if match:
+                return float(match.group(1))
+        return None
+
+    def find_bp() -> tuple[float | None, float | None]:
+        for line in lines:
+            if not re.search(r"\b(bp|blood pressure)\b", line, re.IGNORECASE):
+                continue
+            match = re.search(r"(\d{2,3})\s*/\s*(\d{2,3})", line)
+            if match:
+                return float(match.group(1)), float(match.group(2))
+        return None, None
+
+    values.a1c = find_value([r"\ba1c\b", r"hemoglobin a1c", r"hba1c"], r"(\d+(?:\.\d+)?)\s*%?", [r"%"])
+    values.fasting_glucose = find_value(
+        [r"fasting glucose", r"glucose, fasting", r"\bfpg\b"], r"(\d+(?:\.\d+)?)", [r"mg/dl", r"mmol/l"]
+    )
+    values.egfr = find_value(
+        [r"\begfr\b", r"estimated gfr"], r"(\d+(?:\.\d+)?)", [r"ml/min", r"ml/min/1\.73", r"ml/min/1\.73m2"]
+    )
+    values.creatinine = find_value(
+        [r"creatinine", r"serum creatinine"], r"(\d+(?:\.\d+)?)", [r"mg/dl", r"umol/l"]
+    )
+    values.ldl = find_value([r"\bldl\b", r"ldl cholesterol"], r"(\d+(?:\.\d+)?)", [r"mg/dl", r"mmol/l"])
+    values.hdl = find_value([r"\bhdl\b", r"hdl cholesterol"], r"(\d+(?:\.\d+)?)", [r"mg/dl", r"mmol/l"])
+    values.triglycerides = find_value(
+        [r"triglycerides", r"\btg\b"], r"(\d+(?:\.\d+)?)", [r"mg/dl", r"mmol/l"]
+    )
+    values.urine_albumin = find_value(
+        [r"albumin/creatinine ratio", r"urine albumin", r"\bacr\b"],
+        r"(\d+(?:\.\d+)?)",
+        [r"mg/g", r"mg\/g", r"mg/mmol"],
+    )
+    values.systolic_bp, values.diastolic_bp = find_bp()
+
+    parser._add_range_flags(values, flags)
+    for field_name, value in values.model_dump().items():
+        if value is None:
+            missing.append(field_name)
+    if len(text.strip()) < 50:
+        flags.append("low_text_confidence")
+    return values, missing, flags
+
+
+def make_document(rng: random.Random, pages: int, label_rate: float = 0.25) -> str:
+    lines: list[str] = []
+    for page in range(1, pages + 1):
+        for _ in range(rng.randint(20, 60)):
+            roll = rng.random()
+            if roll < label_rate:
+                field = rng.choice(list(LABEL_VARIANTS))
+                label = rng.choice(LABEL_VARIANTS[field])
+                if rng.random() < 0.3:
+                    label = label.lower() if rng.random() < 0.5 else label.upper()
+                value = rng.choice([f"{rng.uniform(0, 600):.1f}", str(rng.randint(0, 900)), "pending", "H"])
+                sep = rng.choice([": ", " ", "  ....  ", "\t"])
+                lines.append(f"{label}{sep}{value} {rng.choice(UNITS)}")
+            elif roll < label_rate * 1.2:
+                lines.append(
+                    f"{rng.choice(['BP', 'Blood Pressure', 'bp'])}: {rng.randint(60, 260)}/{rng.randint(30, 160)}"
+                )
+            else:
+                lines.append(rng.choice(NOISE).format(page=page, pages=pages))
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser_args = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser_args.add_argument("--documents", type=int, default=2000)
+    parser_args.add_argument("--pages", type=int, default=40, help="pages in the large timing document")
+    parser_args.add_argument("--seed", type=int, default=7)
+    args = parser_args.parse_args()
+
+    rng = random.Random(args.seed)
+    parser = LabParser()
+    corpus = [make_document(rng, rng.randint(1, 3)) for _ in range(args.documents)]
+    corpus += ["", "A1C 7.1", "HbA1c 6.2 %", "Albumin/Creatinine Ratio 45 mg/g\nCreatinine 1.2", "BP 120/80"]
+
+    for text in corpus:
+        expected = reference_extract(parser, text)
+        actual = parser._extract_values(text)
+        if expected != actual:
+            raise SystemExit(f"Mismatch on document:\n{text}\nexpected {expected}\nactual   {actual}")
+    print(f"golden corpus: {len(corpus)} documents identical")
+
+    # Sparse analytes over many pages: the shape of multi-page OCR output where most lines are noise.
+    large = make_document(rng, args.pages, label_rate=0.002)
+    size_kb = len(large.encode()) / 1024
+    timed = (
+        ("reference", lambda: reference_extract(parser, large)),
+        ("compiled", lambda: parser._extract_values(large)),
+    )
+    for label, fn in timed:
+        fn()
+        runs = 20
+        started = perf_counter()
+        for _ in range(runs):
+            fn()
+        elapsed = (perf_counter() - started) / runs
+        print(
+            f"{label:>9}: {elapsed * 1000:8.2f} ms per {args.pages}-page document "
+            f"({size_kb / 1024 / elapsed:6.1f} MB/s)"
+        )
+
+
+if __name__ == "__main__":
+    main()
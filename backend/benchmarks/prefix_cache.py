@@ -0,0 +1,83 @@
+"""Measure prefill time saved by resuming from each agent's cached prompt prefix.
+
+Run from ``backend/``::
+
+    python -m benchmarks.prefix_cache --repeats 20
+"""
+from __future__ import annotations
+
+import argparse
+import copy
+from statistics import median
+from time import perf_counter
+
+import torch
+
+from app.schemas import ComplicationRisk, LabValues, RiskScores
+from app.services.cognitive import CognitiveAgent
+from app.services.lab_value_agent import LabValueAgent
+from app.services.llm import prefix_kv_cache
+from app.services.model_registry import ModelRegistry
+from app.services.recommendations import RecommendationService
+
+
+def _agent_prompts() -> dict[str, tuple[str, str]]:
+    risk = ComplicationRisk(score=42.0, level="Moderate")
+    risks = RiskScores(dementia=risk, cardiovascular=risk, retinopathy=risk, nephropathy=risk, neuropathy=risk)
+    labs = LabValues(a1c=7.8, fasting_glucose=142, egfr=72, creatinine=1.1, ldl=132, hdl=46, systolic_bp=142)
+    return {
+        "Lab Value Agent": (LabValueAgent.PROMPT_PREFIX, LabValueAgent()._prompt(labs)),
+        "Cognitive Agent": (CognitiveAgent.PROMPT_PREFIX, CognitiveAgent()._prompt("Recalled 2 of 3 words.")),
+        "Recommendation Agent": (RecommendationService.PROMPT_PREFIX, RecommendationService()._prompt(risks)),
+    }
+
+
+def _time(fn, repeats: int) -> float:
+    fn()
+    samples = []
+    for _ in range(repeats):
+        started = perf_counter()
+        fn()
+        samples.append((perf_counter() - started) * 1000)
+    return median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    tokenizer, model = ModelRegistry.instance().load_medgemma_text()
+    device = next(model.parameters()).device
+
+    for agent, (prefix, prompt) in _agent_prompts().items():
+        full_ids = tokenizer(prompt, return_tensors="pt")["input_ids"].to(device)
+        prefix_ids, cache = prefix_kv_cache._get(tokenizer, model, prefix, device)
+        suffix_ids = tokenizer(prompt[len(prefix):], return_tensors="pt", add_special_tokens=False)["input_ids"]
+        suffix_ids = suffix_ids.to(device)
+        positions = torch.arange(prefix_ids.shape[1], prefix_ids.shape[1] + suffix_ids.shape[1], device=device)
+
+        def full_prefill() -> None:
+            with torch.no_grad():
+                model(input_ids=full_ids, use_cache=True)
+
+        def suffix_prefill() -> None:
+            with torch.no_grad():
+                model(
+                    input_ids=suffix_ids,
+                    past_key_values=copy.deepcopy(cache),
+                    cache_position=positions,
+                    use_cache=True,
+                )
+
+        full_ms = _time(full_prefill, args.repeats)
+        suffix_ms = _time(suffix_prefill, args.repeats)
+        print(
+            f"{agent:>21}: prefix {prefix_ids.shape[1]:>3} tok, suffix {suffix_ids.shape[1]:>3} tok | "
+            f"full prefill {full_ms:7.2f} ms | cached prefix {suffix_ms:7.2f} ms | "
+            f"saved {full_ms - suffix_ms:7.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
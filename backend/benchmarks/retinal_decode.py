@@ -0,0 +1,125 @@
+"""Time decode + preprocessing of fundus uploads and measure peak RSS per image.
+
+Compares the previous path (full-resolution decode, then a separate resize for
+each vision processor) with ``load_fundus`` (draft-mode JPEG decode, disc crop,
+one resize). Each measurement runs in a fresh process so its peak RSS reflects
+a single image. Synthetic fundus-like JPEGs are generated unless ``--images``
+are given.
+
+Run from ``backend/``::
+
+    python -m benchmarks.retinal_decode --megapixels 12 24
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import multiprocessing
+import resource
+import sys
+from pathlib import Path
+from time import perf_counter
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+
+from app.services.retinal_image import load_fundus
+
+# Input sizes of the two vision processors the old path resized for separately.
+PROCESSOR_SIZES = (448, 896)
+
+
+def synthetic_fundus(megapixels: float, seed: int = 0) -> bytes:
+    height = int((megapixels * 1_000_000 / 1.5) ** 0.5)
+    width = int(height * 1.5)
+    radius = int(height * 0.47)
+    center = (width // 2, height // 2)
+    disc = Image.new("L", (width, height))
+    ImageDraw.Draw(disc).ellipse(
+        (center[0] - radius, center[1] - radius, center[0] + radius, center[1] + radius),
+        fill=255,
+    )
+    noise = np.random.default_rng(seed).integers(0, 40, (height // 8, width // 8, 3), dtype=np.uint8)
+    texture = Image.fromarray(noise).resize((width, height)).filter(ImageFilter.GaussianBlur(3))
+    retina = Image.blend(Image.new("RGB", (width, height), (190, 90, 40)), texture, 0.2)
+    image = Image.new("RGB", (width, height))
+    image.paste(retina, mask=disc)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=92)
+    return buffer.getvalue()
+
+
+def previous_path(file_bytes: bytes) -> None:
+    image = Image.open(io.BytesIO(file_bytes)).convert("RGB")
+    for size in PROCESSOR_SIZES:
+        image.resize((size, size), Image.Resampling.BICUBIC)
+
+
+def fast_path(file_bytes: bytes) -> None:
+    image = load_fundus(file_bytes, size=max(PROCESSOR_SIZES))
+    for size in PROCESSOR_SIZES:
+        if image.size != (size, size):
+            image.resize((size, size), Image.Resampling.BICUBIC)
+
+
+def _peak_rss_mb() -> float:
+    status = Path("/proc/self/status")
+    if status.exists():
+        for line in status.read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    # ru_maxrss is inherited from the parent across fork/exec, so it is only a fallback.
+    # It is kilobytes on Linux and bytes on macOS.
+    unit = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / unit
+
+
+def _measure(method: str, path: str, repeats: int, results) -> None:
+    file_bytes = Path(path).read_bytes()
+    fn = previous_path if method == "previous" else fast_path
+    baseline_mb = _peak_rss_mb()
+    fn(file_bytes)
+    started = perf_counter()
+    for _ in range(repeats):
+        fn(file_bytes)
+    elapsed_ms = (perf_counter() - started) * 1000 / repeats
+    results.put((elapsed_ms, _peak_rss_mb() - baseline_mb))
+
+
+def measure(method: str, path: str, repeats: int) -> tuple[float, float]:
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_measure, args=(method, path, repeats, results))
+    process.start()
+    outcome = results.get()
+    process.join()
+    return outcome
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", nargs="*", default=[], help="fundus JPEGs to use instead of synthetic ones")
+    parser.add_argument("--megapixels", nargs="*", type=float, default=[12, 24])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--workdir", default="/tmp/retinal_decode_bench")
+    args = parser.parse_args()
+
+    paths = list(args.images)
+    if not paths:
+        Path(args.workdir).mkdir(parents=True, exist_ok=True)
+        for megapixels in args.megapixels:
+            path = Path(args.workdir) / f"fundus_{megapixels:g}mp.jpg"
+            if not path.exists():
+                path.write_bytes(synthetic_fundus(megapixels))
+            paths.append(str(path))
+
+    for path in paths:
+        with Image.open(path) as image:
+            label = f"{Path(path).name} ({image.width}x{image.height})"
+        for method in ("previous", "fast"):
+            elapsed_ms, peak_mb = measure(method, path, args.repeats)
+            print(f"{label:>36} {method:>8}: {elapsed_ms:8.1f} ms per image, peak RSS +{peak_mb:7.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
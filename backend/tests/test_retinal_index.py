@@ -0,0 +1,27 @@
+import numpy as np
+
+from app.services.retinal_index import RetinalEmbeddingIndex
+
+
+def _embedding(seed: int, dim: int = 8) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+
+
+def test_partial_append_is_cut_back_before_the_next_add(tmp_path):
+    index = RetinalEmbeddingIndex(directory=str(tmp_path), model_id="test-model")
+    index.add(1, _embedding(1))
+    index.add(2, _embedding(2))
+
+    # A crash between the two writes of an add: the vector landed, its id did not.
+    with (tmp_path / "vectors.f16").open("ab") as handle:
+        handle.write(_embedding(3).astype(np.float16).tobytes())
+
+    reopened = RetinalEmbeddingIndex(directory=str(tmp_path), model_id="test-model")
+    assert len(reopened) == 2
+    reopened.add(4, _embedding(4))
+
+    assert len(reopened) == 3
+    for analysis_id in (1, 2, 4):
+        nearest_id, distance = reopened.nearest(_embedding(analysis_id))
+        assert nearest_id == analysis_id
+        assert distance < 1e-3
@@ -28,8 +28,17 @@ module.exports = async (req, res) => {
       res.setHeader(key, value);
     });
 
-    const buffer = Buffer.from(await response.arrayBuffer());
-    res.end(buffer);
+    // Pass the body through chunk by chunk so Server-Sent Events reach the browser as they arrive.
+    if (typeof res.flushHeaders === "function") res.flushHeaders();
+    if (response.body) {
+      const reader = response.body.getReader();
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        res.write(Buffer.from(value));
+      }
+    }
+    res.end();
   } catch (error) {
     res.statusCode = 502;
     res.setHeader("Content-Type", "application/json");
@@ -15,6 +15,7 @@ const trendMeta = document.getElementById("trendMeta");
 const vitalsGrid = document.getElementById("vitalsGrid");
 const historyOutput = document.getElementById("historyOutput");
 const refreshHistory = document.getElementById("refreshHistory");
+const patientIdInput = document.getElementById("patientId");
 
 const stringify = (obj) => JSON.stringify(obj, null, 2);
 
@@ -95,9 +96,13 @@ const submitAnalysis = async ({ labFile, retinalFile, cognitiveNotes }) => {
   if (cognitiveNotes) {
     formData.append("cognitive_notes", cognitiveNotes);
   }
+  const patientId = patientIdInput.value.trim();
+  if (patientId) {
+    formData.append("patient_id", patientId);
+  }
 
   try {
-    const res = await fetch(buildUrl("/api/analyze"), {
+    const res = await fetch(buildUrl("/api/analyze/stream"), {
       method: "POST",
       body: formData,
     });
@@ -105,7 +110,21 @@ const submitAnalysis = async ({ labFile, retinalFile, cognitiveNotes }) => {
       const text = await res.text();
       throw new Error(text || `HTTP ${res.status}`);
     }
-    const data = await res.json();
+    const finished = [];
+    let data = null;
+    await readEventStream(res, (event, payload) => {
+      if (event === "error") throw new Error(payload.detail);
+      if (event === "complete") {
+        data = payload;
+        return;
+      }
+      finished.push(payload.trace);
+      analysisOutput.textContent = [
+        "Running analysis...",
+        ...finished.map((item) => `${item.agent}: ${item.status} (${item.duration_ms ?? 0} ms)`),
+      ].join("\n");
+    });
+    if (!data) throw new Error("Analysis stream ended before completion.");
     renderSummary(data);
     analysisOutput.textContent = stringify(data);
   } catch (err) {
@@ -113,6 +132,26 @@ const submitAnalysis = async ({ labFile, retinalFile, cognitiveNotes }) => {
   }
 };
 
+const readEventStream = async (res, onEvent) => {
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let boundary = buffer.indexOf("\n\n");
+    while (boundary !== -1) {
+      const chunk = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      const event = chunk.match(/^event: (.*)$/m)?.[1] || "message";
+      const data = chunk.match(/^data: (.*)$/m)?.[1];
+      if (data) onEvent(event, JSON.parse(data));
+      boundary = buffer.indexOf("\n\n");
+    }
+  }
+};
+
 const resetDashboard = () => {
   summarySection.classList.add("hidden");
   riskCards.innerHTML = "";
@@ -164,7 +203,9 @@ const buildDemoLabFile = () => {
 refreshHistory.addEventListener("click", async () => {
   historyOutput.textContent = "Loading history...";
   try {
-    const res = await fetch(buildUrl("/api/history?limit=5"));
+    const patientId = patientIdInput.value.trim();
+    const query = patientId ? `&patient_id=${encodeURIComponent(patientId)}` : "";
+    const res = await fetch(buildUrl(`/api/history?limit=5${query}`));
     if (!res.ok) throw new Error(`HTTP ${res.status}`);
     const data = await res.json();
     historyOutput.textContent = stringify(data);
@@ -296,11 +337,14 @@ const renderTrace = (traceItems) => {
   agentTrace.innerHTML = traceItems
     .map((item) => {
       const duration = item.duration_ms !== null && item.duration_ms !== undefined ? `${item.duration_ms} ms` : "";
+      const offset =
+        item.start_offset_ms !== null && item.start_offset_ms !== undefined ? ` @ +${item.start_offset_ms} ms` : "";
+      const cached = item.cache_hit ? " • CACHED" : "";
       const notes = item.notes ? `<div class="trace-notes">${item.notes}</div>` : "";
       return `
         <div class="trace-item trace-${item.status}">
           <div class="trace-title">${item.agent}</div>
-          <div class="trace-meta">${item.status.toUpperCase()} • ${duration}</div>
+          <div class="trace-meta">${item.status.toUpperCase()} • ${duration}${offset}${cached}</div>
           ${notes}
         </div>
       `;